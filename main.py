@@ -1,17 +1,32 @@
 import pygame
 import logging
+import os
 import sys
 
 from pygame.math import Vector2
 
+from scripts.contacts import SweepAndPrune
 from scripts.entity import Player, Controls
-from scripts.animation import load_animations
+from scripts.animation import AnimationLoader, load_atlas, shared_clock
 from scripts.renderer import Window
-from scripts.input import Keyboard
+from scripts.input import Controller, ControllerManager, EventBus, Keyboard
 from scripts.map import Tile, TileMap
+from scripts.pacing import FramePacer
+from scripts.particles import ParticleSystem
+from scripts.pixel_cache import PixelCache
+from scripts.physics import EntityStore
+from scripts.profiler import Profiler
+from scripts.rewind import RewindBuffer
+from scripts.streaming import StreamingTileMap
+from scripts.timeline import World
 from scripts.settings import Settings
 
 ASSET_PATH = "data/images/"
+ATLAS_PATH = "data/atlas.json"  # built by scripts/atlas.py
+PIXEL_CACHE_PATH = "data/.cache/pixels.bin"
+PROFILE_PATH = "profile.json"
+LEVEL_PATH = "data/level"  # chunked level, see scripts/streaming.py
+TIMELINE_PATHS = (LEVEL_PATH, "data/level_past")  # one chunked level per timeline, those that exist are loaded
 
 logging.basicConfig(
     level=logging.INFO,  # set the log level
@@ -33,59 +48,185 @@ class Game:
 
         self.settings = Settings()
 
-        self.window = Window(self.settings.resolution, 5, pygame.HWSURFACE | pygame.SCALED)
+        self.window = Window(self.settings.resolution, 5, pygame.HWSURFACE | pygame.FULLSCREEN | pygame.SCALED)
 
-        self.assets = load_animations(ASSET_PATH)
-        self.clock = pygame.time.Clock()
+        self.pixel_cache = PixelCache(PIXEL_CACHE_PATH)
+        if os.path.exists(ATLAS_PATH):
+            self.assets = load_atlas(ATLAS_PATH, self.pixel_cache)
+        else:
+            # frames are decoded on first use, the player's starting animation in the background now
+            self.assets = AnimationLoader(ASSET_PATH, lazy=True, prefetch=["player/idle"], cache=self.pixel_cache)
+        self.pacer = FramePacer(self.window, self.settings.targetFPS, enabled=self.settings.dynamicResolution)
         self.key_controls = Controls(pygame.K_a, pygame.K_d, pygame.K_SPACE)
         self.keyboard = Keyboard(self.key_controls)
-        self.dt = 1
+        self.pad_controls = Controls(0, 0, 0)  # controller movement is the left stick, jump is button 0
+        self.controllers = ControllerManager(self.pad_controls, self.controller_connected, self.controller_disconnected)
+        self.dt = 1 / self.settings.tickRate
+        self.profiler = Profiler(enabled=self.settings.profile)
+        self.animation_clock = shared_clock  # advances every entity's animation at once
 
         self.entities = pygame.sprite.Group()
-        self.tile_map = TileMap()
+        self.physics = EntityStore()  # integrates every non-player entity added with physics
 
         self.player = Player(self.assets, "player", (50, 50), (9, 18), self.keyboard)
         self.player.set_offset((-2, 0), True)
-
-        tile = Tile((100, 0, 0), (0, 200), (5000, 20))
-        tile1 = Tile((100, 0, 0), (1000, 150), (700, 20))
-        tile2 = Tile((255, 255, 0), (2000, 150), (700, 20))
-        tile3 = Tile((0, 0, 255), (3000, 150), (700, 20))
-        self.tile_map.add(tile, tile1, tile2, tile3)
-
-    def draw(self):
+        self.particles = ParticleSystem()
+        self.player.particles = self.particles
+        self.contacts = SweepAndPrune()  # entity-vs-entity contacts
+        self.contacts.add(self.player)
+
+        if os.path.exists(LEVEL_PATH):
+            self.world = World(StreamingTileMap(path) for path in TIMELINE_PATHS if os.path.exists(path))
+            self.world.stream(self.player.rect, wait=True)
+        else:
+            present = TileMap()
+            tile = Tile((100, 0, 0), (0, 200), (5000, 20))
+            tile1 = Tile((100, 0, 0), (1000, 150), (700, 20))
+            tile2 = Tile((255, 255, 0), (2000, 150), (700, 20))
+            tile3 = Tile((0, 0, 255), (3000, 150), (700, 20))
+            present.add(tile, tile1, tile2, tile3)
+
+            past = TileMap()
+            tile = Tile((40, 60, 40), (0, 200), (5000, 20))
+            tile1 = Tile((40, 60, 40), (600, 150), (300, 20))
+            tile2 = Tile((0, 120, 60), (1400, 120), (500, 20))
+            tile3 = Tile((120, 80, 0), (2600, 150), (900, 20))
+            past.add(tile, tile1, tile2, tile3)
+            self.world = World([present, past])
+
+        self.rewind = RewindBuffer([self.player])
+        self.rewinding = False
+
+        self.events = EventBus()
+        self.player.subscribe(self.events)
+        self.controllers.subscribe(self.events)
+        self.events.subscribe(pygame.QUIT, self.quit)
+        self.events.subscribe(pygame.KEYDOWN, self.rewind_input, (self.key_controls.rewind,))
+        self.events.subscribe(pygame.KEYUP, self.rewind_input, (self.key_controls.rewind,))
+        self.events.subscribe(pygame.KEYDOWN, self.switch_input, (self.key_controls.switch,))
+        self.events.subscribe(pygame.KEYDOWN, self.profiler_input, (pygame.K_F3, pygame.K_F4))
+
+    # Changing the entities restarts the rewind history
+    def add_entity(self, entity, physics=True):
+        self.entities.add(entity)
+        entity.subscribe(self.events)
+        self.contacts.add(entity)
+        if physics:
+            self.physics.add(entity)
+        self.rewind = RewindBuffer([self.player, *self.entities])
+
+    def remove_entity(self, entity):
+        self.entities.remove(entity)
+        self.events.unsubscribe(entity)
+        self.contacts.remove(entity)
+        if entity in self.physics:
+            self.physics.remove(entity)
+        self.rewind = RewindBuffer([self.player, *self.entities])
+
+    # alpha is how far between the last two simulation steps this frame falls
+    def draw(self, alpha=1):
+        self.window.interpolate(alpha)
         self.window.screen.fill((200, 200, 200))
 
         for e in self.entities:
-            e.draw(self.window)
-
-        self.player.draw(self.window)
-        self.tile_map.draw(self.window)
+            self.profiler.begin_entity("draw", e)
+            e.draw(self.window, alpha)
+            self.profiler.end_entity("draw", e)
+
+        self.player.draw(self.window, alpha)
+        self.world.active.draw(self.window)
+        self.particles.draw(self.window)
+        self.window.flush()
+        self.profiler.draw(self.window, self.pacer.budget)
         self.window.draw()
         pygame.display.flip()
 
     def event_handler(self):
         for event in pygame.event.get():
-            for e in self.entities:
-                e.event_handler(event)
-            self.player.event_handler(event)
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+            self.events.dispatch(event)
+
+    # The first connected controller drives the player, the keyboard takes over again once none is left
+    def controller_connected(self, controller):
+        if not isinstance(self.player.input, Controller):
+            self.player.set_input(controller)
+
+    def controller_disconnected(self, controller):
+        if self.player.input is controller:
+            self.player.set_input(next(iter(self.controllers.controllers.values()), self.keyboard))
+
+    # When rewinding stops, the physics store picks up the rewound state of its entities
+    def rewind_input(self, event):
+        self.rewinding = event.type == pygame.KEYDOWN
+        if not self.rewinding:
+            self.physics.sync(*self.physics.entities)
+
+    # Switches to the next timeline unless the player would end up inside a wall there.
+    # The rewind history is dropped since it was recorded in the other timeline
+    def switch_input(self, event):
+        if self.rewinding or self.world.would_collide(self.player.rect):
+            return
+        self.world.switch()
+        self.rewind.clear()
+        self.particles.burst(self.player.get_center())
+
+    def profiler_input(self, event):
+        if event.key == pygame.K_F3:
+            self.profiler.toggle()
+        elif event.key == pygame.K_F4:
+            self.profiler.export_json(PROFILE_PATH)
+
+    def quit(self, event=None):
+        self.pixel_cache.save()
+        pygame.quit()
+        sys.exit()
 
     def update(self):
-        self.dt = self.clock.tick(60) / 1000
+        # while rewinding, time runs backwards one recorded tick per step instead of simulating
+        if self.rewinding:
+            self.rewind.step_back()
+            self.window.update()
+            return
+
+        self.animation_clock.tick(self.dt)
         for e in self.entities:
+            self.profiler.begin_entity("update", e)
             e.update(self.dt)
-        self.player.update(self.dt, self.tile_map)
+            self.profiler.end_entity("update", e)
+        tile_map = self.world.active
+        self.physics.update(self.dt, tile_map)
+        self.player.update(self.dt, tile_map)
+        self.contacts.update()
+        self.particles.update(self.dt)
+        self.rewind.record()
         self.window.set_target(self.player, (0, -50))
         self.window.update()
+        self.world.stream(self.window.camera)
+        self.world.prebake(self.window.camera)
 
+    # Runs the simulation at a fixed tick rate and renders at up to targetFPS
     def run(self):
+        accumulator = 0
         while True:
-            self.draw()
-            self.update()
+            accumulator += self.pacer.tick() / 1000
+            self.profiler.begin("event_handler")
             self.event_handler()
+            self.profiler.end("event_handler")
+
+            self.profiler.begin("update")
+            steps = 0
+            while accumulator >= self.dt and steps < self.settings.maxSteps:
+                self.update()
+                accumulator -= self.dt
+                steps += 1
+            # drop time we could not catch up on rather than spiralling
+            if steps == self.settings.maxSteps:
+                accumulator = min(accumulator, self.dt)
+            self.profiler.end("update")
+
+            self.profiler.begin("draw")
+            self.draw(accumulator / self.dt)
+            self.profiler.end("draw")
+            self.profiler.end_frame()
 
 
 if __name__ == "__main__":
@@ -3,84 +3,246 @@ import pygame
 import json
 import os
 import logging
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+ROTATION_STEP = 2  # degrees rotated frames are quantized to
+ROTATION_CACHE_SIZE = 256  # rotated frames kept per animation
+
 # Animation System
 
 
 class Animation:
+    """
+    An immutable frame sequence, one per assets key and shared by every entity playing it. The per-entity playback position lives in a Playback, so changing animation never copies anything.
+    """
+
     def __init__(self, images, img_dur=0.2, loop=True):
         self.images = images
         self.loop = loop
         self.img_duration = img_dur
-        self.duration = self.img_duration
-        self.done = False
-        self.frame = 0
-        self.time_elapsed = 0
-
-    # Returns a copy of itself
-    def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
-
-    # Updates the current frame (uses deltatime)
-    def update(self, dt):
-        self.time_elapsed += dt
-        while self.time_elapsed >= self.duration:
-            if self.duration == 0:
-                break
-
-            self.time_elapsed -= self.duration
-            if self.loop:
-                self.frame = (self.frame + 1) % len(self.images)
-            else:
-                self.frame = min(self.frame + 1, len(self.images) - 1)
-                if self.frame == len(self.images) - 1:
-                    self.done = True
-
-    # Returns the current frame
-    def img(self):
-        return self.images[self.frame]
+
+        # flipped frames and rotated frames are built once for every entity playing the animation
+        for img in self.images:
+            img.set_colorkey((0, 0, 0))
+        self.flipped = [pygame.transform.flip(img, True, False) for img in self.images]
+        for img in self.flipped:
+            img.set_colorkey((0, 0, 0))
+        self.rotations = OrderedDict()
+
+    def __len__(self):
+        return len(self.images)
+
+    # Returns the frame shown at a phase (a position counted in frames)
+    def frame_at(self, phase):
+        if self.loop:
+            return int(phase) % len(self.images)
+        return min(int(phase), len(self.images) - 1)
+
+    # Returns a frame
+    def img(self, flip=False, frame=0):
+        return self.flipped[frame] if flip else self.images[frame]
+
+    # Returns a frame rotated (then flipped), cached by quantized angle
+    def rotated(self, angle, flip=False, frame=0):
+        angle = round(angle / ROTATION_STEP) * ROTATION_STEP % 360
+        key = (frame, flip, angle)
+        img = self.rotations.get(key)
+        if img is not None:
+            self.rotations.move_to_end(key)
+            return img
+
+        img = pygame.transform.rotate(self.images[frame], angle)
+        if flip:
+            img = pygame.transform.flip(img, True, False)
+        img.set_colorkey((0, 0, 0))
+        self.rotations[key] = img
+        if len(self.rotations) > ROTATION_CACHE_SIZE:
+            self.rotations.popitem(last=False)
+        return img
+
+
+class AnimationClock:
+    """
+    Time shared by every Playback using it. Ticking the clock once per simulation step advances all of their animations together.
+    """
+
+    def __init__(self):
+        self.time = 0
+
+    def tick(self, dt):
+        self.time += dt
+
+
+# the clock entities use unless they are given their own, ticked by whatever runs the simulation
+shared_clock = AnimationClock()
+
+
+class Playback:
+    """
+    Where an entity is in an Animation. The phase (in frames) is worked out from the clock when it is read: the phase it had at start, plus the clock time since then times the rate. Playing, seeking and changing rate only reset those three values.
+    """
+
+    __slots__ = ("animation", "clock", "phase0", "start", "rate")
+
+    def __init__(self, animation, clock=None):
+        self.clock = clock or shared_clock
+        self.play(animation)
+
+    # Starts an animation from its first frame at normal speed
+    def play(self, animation):
+        self.animation = animation
+        self.phase0 = 0
+        self.start = self.clock.time
+        self.rate = 1
+
+    # Changes the playback speed (1 is the animation's img_duration per frame, 0 holds the frame)
+    def set_rate(self, rate):
+        if rate != self.rate:
+            self.seek(self.phase)
+            self.rate = rate
+
+    def seek(self, phase):
+        self.phase0 = phase
+        self.start = self.clock.time
+
+    @property
+    def phase(self):
+        animation = self.animation
+        phase = self.phase0 + (self.clock.time - self.start) * self.rate / animation.img_duration
+        # looping animations are kept to one cycle so the value stays small
+        return phase % len(animation.images) if animation.loop else phase
+
+    @property
+    def frame(self):
+        return self.animation.frame_at(self.phase)
+
+    # A non-looping animation is done once it reaches its last frame
+    @property
+    def done(self):
+        return not self.animation.loop and self.phase >= len(self.animation.images) - 1
 
 
 # Loads an image using its location
 
 
-def load_image(path):
-    img = pygame.image.load(path).convert_alpha()
+def load_image(path, cache=None):
+    img = decode_image(path, cache).convert_alpha()
     return img
 
 
+# Decodes an image without converting it, safe to call off the main thread
+def decode_image(path, cache=None):
+    if cache:
+        return cache.load(path)
+    return pygame.image.load(path)
+
+
 # Loads a group of images in a directory
-def load_images(path):
+def load_images(path, cache=None):
     images = []
     for img_name in sorted(os.listdir(path)):
         img_path = os.path.join(path, img_name)
         if os.path.isfile(img_path):
-            img = load_image(img_path)
+            img = load_image(img_path, cache)
             if img:
                 images.append(img)
     return images
 
 
-def load_animations(base_path, data="data/animation_data.json"):
-    assets = {}
-    with open(data, "rb") as file:
-        data = json.load(file)
-
+# Returns {key: [frame paths]} for every animation directory under base_path, e.g. "player/idle",
+# with the frames in file name order. Only walks the directory tree, no image is opened
+def animation_paths(base_path):
+    paths = {}
     for root, dirs, files in os.walk(base_path):
         for dir_name in dirs:
             dir_path = os.path.join(root, dir_name)
             relative_path = os.path.relpath(dir_path, base_path).replace("\\", "/")
-            logger.info("Loading animations from directory: %s", dir_path)  # Debug info
-            if relative_path in data:
-                assets[relative_path] = Animation(
-                    load_images(dir_path),
-                    data[relative_path]["img_dur"],
-                    data[relative_path]["loop"],
-                )
-            else:
-                assets[relative_path] = Animation(load_images(dir_path))
+            paths[relative_path] = [
+                os.path.join(dir_path, img_name)
+                for img_name in sorted(os.listdir(dir_path))
+                if os.path.isfile(os.path.join(dir_path, img_name))
+            ]
+    return paths
+
+
+class AnimationLoader(Mapping):
+    """
+    Maps animation keys ("player/idle") to Animations, decoding frames on a thread pool. In lazy mode an animation is only decoded the first time it is looked up (e.g. by Entity.set_action), apart from the keys passed in prefetch which start decoding in the background straight away. An optional PixelCache skips PNG decoding for frames decoded on a previous run.
+    """
+
+    def __init__(self, base_path, data="data/animation_data.json", lazy=False, prefetch=(), workers=None, cache=None):
+        self.cache = cache
+        with open(data, "rb") as file:
+            self.data = json.load(file)
+
+        # only the directory tree is walked up front, no image is opened
+        self.paths = animation_paths(base_path)
+
+        self.animations = {}
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(workers)
+        self.prefetch(self.paths if not lazy else prefetch)
+
+    # Starts decoding the frames of the given keys in the background
+    def prefetch(self, keys):
+        for key in keys:
+            if key not in self.animations and key not in self.pending:
+                self.pending[key] = [self.executor.submit(decode_image, path, self.cache) for path in self.paths[key]]
+
+    def __getitem__(self, key):
+        if key in self.animations:
+            return self.animations[key]
+        if key not in self.paths:
+            raise KeyError(key)
+
+        self.prefetch((key,))
+        logger.info("Loading animation: %s", key)
+        # surfaces are converted on the calling thread once decoded
+        images = [future.result().convert_alpha() for future in self.pending.pop(key)]
+        if key in self.data:
+            animation = Animation(images, self.data[key]["img_dur"], self.data[key]["loop"])
+        else:
+            animation = Animation(images)
+        self.animations[key] = animation
+        return animation
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    # Stops the worker threads once nothing else needs decoding
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_animations(base_path, data="data/animation_data.json", workers=None, cache=None):
+    loader = AnimationLoader(base_path, data, workers=workers, cache=cache)
+    assets = dict(loader)
+    loader.close()
 
     logger.debug("Animation keys added: %s", assets.keys())  #
     return assets
+
+
+# Loads animations from a packed atlas (see scripts/atlas.py), every frame is a subsurface of one image
+def load_atlas(manifest, cache=None):
+    with open(manifest, "rb") as file:
+        data = json.load(file)
+
+    atlas = load_image(os.path.join(os.path.dirname(manifest), data["image"]), cache)
+    assets = {}
+    for tag, animation in data["animations"].items():
+        assets[tag] = Animation(
+            [atlas.subsurface(rect) for rect in animation["frames"]],
+            animation.get("img_dur", 0.2),
+            animation.get("loop", True),
+        )
+
+    logger.debug("Animation keys added from atlas: %s", assets.keys())
+    return assets
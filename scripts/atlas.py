@@ -0,0 +1,88 @@
+# Texture atlas packer
+#
+# Packs every animation frame under data/images into one atlas image and writes
+# a manifest extending animation_data.json with each frame's rect in the atlas.
+# Re-run after adding or changing frames:
+#
+#   python -m scripts.atlas
+
+# Modules
+import pygame
+import json
+import os
+import logging
+import argparse
+
+# Scripts
+from scripts.animation import animation_paths
+
+logger = logging.getLogger(__name__)
+
+ASSET_PATH = "data/images/"
+ANIMATION_DATA = "data/animation_data.json"
+ATLAS_MANIFEST = "data/atlas.json"
+ATLAS_IMAGE = "data/atlas.png"
+
+
+# Shelf packs sizes into rows of at most max_width, tallest first. Returns (rects, size)
+def shelf_pack(sizes, max_width=1024, padding=1):
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    rects = [None] * len(sizes)
+    x = y = shelf_height = width = 0
+    for i in order:
+        w, h = sizes[i]
+        if x and x + w > max_width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        rects[i] = (x, y, w, h)
+        x += w + padding
+        width = max(width, x - padding)
+        shelf_height = max(shelf_height, h)
+    return rects, (max(width, 1), max(y + shelf_height, 1))
+
+
+def pack_atlas(base_path=ASSET_PATH, data=ANIMATION_DATA, manifest=ATLAS_MANIFEST, image=ATLAS_IMAGE, max_width=1024):
+    with open(data, "rb") as file:
+        animation_data = json.load(file)
+
+    frames = animation_paths(base_path)
+    images = []
+    owners = []
+    for tag, paths in frames.items():
+        for path in paths:
+            images.append(pygame.image.load(path))
+            owners.append(tag)
+
+    rects, size = shelf_pack([img.get_size() for img in images], max_width)
+    atlas = pygame.Surface(size, pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    atlas.blits([(img, rect[:2]) for img, rect in zip(images, rects)], doreturn=False)
+    pygame.image.save(atlas, image)
+
+    animations = {}
+    for tag in frames:
+        animations[tag] = dict(animation_data.get(tag, {}), frames=[])
+    for tag, rect in zip(owners, rects):
+        animations[tag]["frames"].append(list(rect))
+
+    with open(manifest, "w") as file:
+        json.dump(
+            {"image": os.path.relpath(image, os.path.dirname(manifest)).replace("\\", "/"), "animations": animations},
+            file,
+            indent=2,
+        )
+    logger.info("Packed %d frames from %d animations into %s %s", len(images), len(frames), image, size)
+    return manifest
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Pack animation frames into a texture atlas")
+    parser.add_argument("--images", default=ASSET_PATH)
+    parser.add_argument("--data", default=ANIMATION_DATA)
+    parser.add_argument("--manifest", default=ATLAS_MANIFEST)
+    parser.add_argument("--atlas", default=ATLAS_IMAGE)
+    parser.add_argument("--max-width", type=int, default=1024)
+    args = parser.parse_args()
+    pack_atlas(args.images, args.data, args.manifest, args.atlas, args.max_width)
@@ -0,0 +1,258 @@
+# Headless performance benchmarks
+#
+# Runs the game's hot paths under SDL's dummy drivers with scripted keyboard
+# input and reports the average time each phase takes per frame.
+#
+#   python -m scripts.benchmark                 run and print the results
+#   python -m scripts.benchmark --save          store the results as the baseline
+#   python -m scripts.benchmark --compare       fail if a phase regressed against the baseline
+
+# Modules
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import logging
+import random
+import sys
+from time import perf_counter
+
+import pygame
+
+# Scripts
+from scripts.animation import AnimationClock, load_animations
+from scripts.entity import Controls, Entity, Player
+from scripts.input import Keyboard
+from scripts.map import Tile, TileMap
+from scripts.renderer import Window
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSET_PATH = os.path.join(ROOT, "data/images/")
+ANIMATION_DATA = os.path.join(ROOT, "data/animation_data.json")
+BASELINE_PATH = os.path.join(ROOT, "data/benchmarks/baseline.json")
+
+TILE_SIZE = 16
+DT = 1 / 60
+
+# (tiles, entities) per scenario
+SCENARIOS = {
+    "small": (1000, 10),
+    "medium": (10000, 100),
+    "large": (100000, 1000),
+}
+
+PHASES = (
+    "Player.update",
+    "TileMap.collision_test",
+    "TileMap.draw",
+    "Entity.draw",
+    "Window.draw",
+)
+
+CONTROLS = Controls(pygame.K_a, pygame.K_d, pygame.K_SPACE)
+
+# (frame, event type, key) - run right, jump a few times, turn around
+INPUT_SCRIPT = (
+    (10, pygame.KEYDOWN, pygame.K_d),
+    (60, pygame.KEYDOWN, pygame.K_SPACE),
+    (62, pygame.KEYUP, pygame.K_SPACE),
+    (120, pygame.KEYDOWN, pygame.K_SPACE),
+    (122, pygame.KEYUP, pygame.K_SPACE),
+    (200, pygame.KEYUP, pygame.K_d),
+    (210, pygame.KEYDOWN, pygame.K_a),
+    (260, pygame.KEYDOWN, pygame.K_SPACE),
+    (262, pygame.KEYUP, pygame.K_SPACE),
+    (320, pygame.KEYUP, pygame.K_a),
+)
+
+
+# Builds a map of tile_count tiles: a long floor with platforms stacked above it
+def generate_map(tile_count, seed=0):
+    rng = random.Random(seed)
+    tile_map = TileMap()
+    floor = min(tile_count, 2000)
+    tiles = [Tile((100, 0, 0), (x * TILE_SIZE, 200), (TILE_SIZE, TILE_SIZE)) for x in range(floor)]
+
+    width = floor * TILE_SIZE
+    while len(tiles) < tile_count:
+        x = rng.randrange(0, width, TILE_SIZE)
+        y = 200 - rng.randrange(3, 200) * TILE_SIZE
+        length = min(rng.randint(2, 12), tile_count - len(tiles))
+        color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+        for i in range(length):
+            tiles.append(Tile(color, (x + i * TILE_SIZE, y), (TILE_SIZE, TILE_SIZE)))
+
+    tile_map.add(tiles)
+    return tile_map
+
+
+# Scatters entities around the player's path so most of them end up on screen
+def generate_entities(assets, count, clock=None, seed=0):
+    rng = random.Random(seed)
+    entities = pygame.sprite.Group()
+    for _ in range(count):
+        entity = Entity(assets, "player", (rng.randint(0, 1500), rng.randint(0, 180)), (9, 18), clock)
+        entity.flip = rng.random() < 0.5
+        entities.add(entity)
+    return entities
+
+
+# Wraps a method so every call adds its duration to timings[phase]
+def time_calls(obj, name, timings, phase):
+    method = getattr(obj, name)
+
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        result = method(*args, **kwargs)
+        timings[phase] += perf_counter() - start
+        return result
+
+    setattr(obj, name, timed)
+
+
+# Groups a (frame, event type, key) script into {frame: [key events]}
+def script_events(script):
+    events = {}
+    for frame, event_type, key in script:
+        events.setdefault(frame, []).append(pygame.event.Event(event_type, key=key))
+    return events
+
+
+def run_scenario(tiles, entities, frames, window, assets, script=INPUT_SCRIPT):
+    clock = AnimationClock()
+    tile_map = generate_map(tiles)
+    crowd = generate_entities(assets, entities, clock)
+    player = Player(assets, "player", (50, 50), (9, 18), Keyboard(CONTROLS), clock)
+    player.set_offset((-2, 0), True)
+    window.true_scroll.update(0, 0)
+    window.set_target(player, (0, -50))
+
+    timings = dict.fromkeys(PHASES, 0.0)
+    time_calls(tile_map, "collision_test", timings, "TileMap.collision_test")
+
+    events = script_events(script)
+
+    for frame in range(frames):
+        for event in events.get(frame, ()):
+            player.event_handler(event)
+
+        clock.tick(DT)
+        for e in crowd:
+            e.update(DT)
+
+        start = perf_counter()
+        player.update(DT, tile_map)
+        timings["Player.update"] += perf_counter() - start
+
+        window.update()
+        window.interpolate(1)
+        window.screen.fill((200, 200, 200))
+
+        # draws only queue their surfaces, each phase flushes its own so the blitting is timed with it
+        start = perf_counter()
+        for e in crowd:
+            e.draw(window)
+        player.draw(window)
+        window.flush()
+        timings["Entity.draw"] += perf_counter() - start
+
+        start = perf_counter()
+        tile_map.draw(window)
+        window.flush()
+        timings["TileMap.draw"] += perf_counter() - start
+
+        start = perf_counter()
+        window.draw()
+        timings["Window.draw"] += perf_counter() - start
+
+    # milliseconds per frame
+    return {phase: total * 1000 / frames for phase, total in timings.items()}
+
+
+def run(scenarios, frames):
+    pygame.init()
+    window = Window((1920, 1080), 5)
+    assets = load_animations(ASSET_PATH, ANIMATION_DATA)
+
+    results = {}
+    for name in scenarios:
+        tiles, entities = SCENARIOS[name]
+        logger.info("Running %s: %d tiles, %d entities, %d frames", name, tiles, entities, frames)
+        results[name] = run_scenario(tiles, entities, frames, window, assets)
+    pygame.quit()
+    return results
+
+
+# Returns (scenario, phase, baseline ms, current ms) for every phase slower than the tolerance allows
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, phases in results.items():
+        for phase, ms in phases.items():
+            before = baseline.get(name, {}).get(phase)
+            if before is not None and ms > before * (1 + tolerance):
+                regressions.append((name, phase, before, ms))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    baseline = baseline or {}
+    for name, phases in results.items():
+        tiles, entities = SCENARIOS[name]
+        print(f"{name} ({tiles} tiles, {entities} entities)")
+        for phase, ms in phases.items():
+            line = f"  {phase:<24}{ms:9.3f} ms"
+            before = baseline.get(name, {}).get(phase)
+            if before:
+                line += f"  ({(ms - before) / before:+.0%} vs baseline)"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless performance benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--frames", type=int, default=360)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="exit with an error on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    os.chdir(ROOT)
+    results = run(args.scenarios or list(SCENARIOS), args.frames)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        merged = dict(baseline or {})
+        merged.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(merged, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}")
+            return 1
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for name, phase, before, ms in regressions:
+            print(f"REGRESSION {name} {phase}: {before:.3f} ms -> {ms:.3f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
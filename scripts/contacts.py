@@ -0,0 +1,95 @@
+# Modules
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def left_edge(entity):
+    return entity.rect.left
+
+
+class SweepAndPrune:
+    """
+    Entity-vs-entity broadphase. Entities are kept sorted by their left edge and re-sorted each update, which is close to linear because they barely move between frames. A sweep along x then only compares entities whose x ranges overlap.
+
+    Each update calls on_contact_begin(other) for new overlaps, on_contact_stay(other) for ongoing ones and on_contact_end(other) for overlaps that stopped, on both entities of the pair.
+    """
+
+    def __init__(self):
+        self.entities = []  # sorted by left edge
+        self.members = set()
+        self.contacts = {}  # (entity, entity) -> None, ordered by id so each pair has one key
+        self.partners = {}  # entity -> the pairs in contacts it is part of
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity):
+        return entity in self.members
+
+    def add(self, *entities):
+        for entity in entities:
+            if entity not in self.members:
+                self.members.add(entity)
+                self.entities.append(entity)
+                self.partners[entity] = set()
+
+    # Removes entities, ending any contacts they still have
+    def remove(self, *entities):
+        removed = set(entities) & self.members
+        if not removed:
+            return
+        self.members -= removed
+        self.entities = [entity for entity in self.entities if entity not in removed]
+        for entity in removed:
+            for pair in self.partners.pop(entity):
+                if pair not in self.contacts:
+                    continue
+                del self.contacts[pair]
+                a, b = pair
+                other = b if a is entity else a
+                if other in self.partners:
+                    self.partners[other].discard(pair)
+                a.on_contact_end(b)
+                b.on_contact_end(a)
+
+    # list.sort is adaptive, close to linear when entities barely moved and n log n after a bulk add
+    def sort(self):
+        self.entities.sort(key=left_edge)
+
+    # Returns every overlapping pair, in sweep order
+    def find_pairs(self):
+        pairs = {}
+        active = []
+        for entity in self.entities:
+            rect = entity.rect
+            # entities are in left edge order, so anything ending before this one starts is done
+            active = [other for other in active if other.rect.right > rect.left]
+            for other in active:
+                if other.rect.top < rect.bottom and rect.top < other.rect.bottom:
+                    pairs[(other, entity) if id(other) < id(entity) else (entity, other)] = None
+            active.append(entity)
+        return pairs
+
+    def update(self):
+        self.sort()
+        pairs = self.find_pairs()
+
+        for pair in self.contacts:
+            if pair not in pairs:
+                a, b = pair
+                self.partners[a].discard(pair)
+                self.partners[b].discard(pair)
+                a.on_contact_end(b)
+                b.on_contact_end(a)
+        for pair in pairs:
+            a, b = pair
+            if pair in self.contacts:
+                a.on_contact_stay(b)
+                b.on_contact_stay(a)
+            else:
+                self.partners[a].add(pair)
+                self.partners[b].add(pair)
+                a.on_contact_begin(b)
+                b.on_contact_begin(a)
+        self.contacts = pairs
@@ -1,25 +1,48 @@
 import pygame
+import math
 from pygame.math import Vector2, clamp
 from dataclasses import dataclass
 
+from scripts.animation import Playback
 from scripts.framework import Timer, random_color
 from scripts.input import Controller
 from scripts.map import Tile, TileMap
 
 
+# Player movement constants, shared with the EntityStore in scripts/physics.py
+MOVEMENT = {
+    # x-axis
+    "acceleration": 5,
+    "deceleration": 20,
+    "max_speed": 300,
+    "friction": 300,
+    "air_acceleration": 4.5,
+    # y-axis
+    "gravity": 600,
+    "jump_speed": -320,
+    "max_fall_speed": 500,
+    "coyote_time": 0.2,  # seconds a jump is still allowed after leaving the ground
+    "jump_buffer_time": 0.2,  # seconds a jump press is remembered before landing
+}
+
+
 @dataclass
 class Controls:
     move_left: int
     move_right: int
     jump: int
+    rewind: int = pygame.K_LSHIFT
+    switch: int = pygame.K_e
 
 
 class Entity(pygame.sprite.Sprite):
-    def __init__(self, assets, tag, transform, size):
+    def __init__(self, assets, tag, transform, size, clock=None):
         super().__init__()
 
         self.assets = assets
+        self.clock = clock
         self.transform = Vector2(transform)
+        self.previous_transform = Vector2(transform)
         self.size = Vector2(size)
         self.movement = Vector2()
         self.tag = tag
@@ -35,21 +58,22 @@ class Entity(pygame.sprite.Sprite):
         self.collisions = pygame.sprite.Group()
 
         self.action = ""
+        self.playback = None
         self.a_offset = Vector2()
         self.flipped_a_offset = Vector2()
         self.debug = False
         self.debug_color = random_color()
         self.set_action("idle")
 
+    @property
+    def animation(self):
+        return self.playback.animation
+
     @property
     def image(self):
-        img = self.animation.img()
         if self.rotation:
-            img = pygame.transform.rotate(img, self.rotation)
-        if self.flip:
-            img = pygame.transform.flip(img, self.flip, False)
-        img.set_colorkey((0, 0, 0))
-        return img
+            return self.animation.rotated(self.rotation, self.flip, self.playback.frame)
+        return self.animation.img(self.flip, self.playback.frame)
 
     def set_offset(self, offset, flip=None):
         if flip:
@@ -60,44 +84,50 @@ class Entity(pygame.sprite.Sprite):
     def set_action(self, action):
         if action != self.action:
             self.action = action
-            self.animation = self.assets[self.tag + "/" + self.action].copy()
-
-    def update_animation(self, dt):
-        self.animation.update(dt)
+            animation = self.assets[self.tag + "/" + self.action]
+            if self.playback is None:
+                self.playback = Playback(animation, self.clock)
+            else:
+                self.playback.play(animation)
 
-    def update(self, dt, *groups):
-        self.check_collisions(*groups)
+    def update(self, dt):
+        self.previous_transform.update(self.transform)
 
     def get_center(self):
         x = self.transform.x + (self.width // 2)
         y = self.transform.y + (self.height // 2)
         return Vector2(x, y)
 
-    def check_collisions(self, *groups):
-        for group in groups:
-            for sprite in group.sprites():
-                if pygame.sprite.collide_rect(self, sprite):
-                    self.collisions.add(sprite)
-                    self.handle_collision(sprite)
-                else:
-                    if self.collisions.has(sprite):
-                        self.collisions.remove(sprite)
+    # Contact callbacks from the SweepAndPrune broadphase, subclasses extend these
+    def on_contact_begin(self, other):
+        self.collisions.add(other)
+
+    def on_contact_stay(self, other):
+        pass
 
-    def handle_collision(self, sprite):
-        pass  # This can be overridden by subclasses
+    def on_contact_end(self, other):
+        self.collisions.remove(other)
 
-    def draw(self, window):
+    # Subscribes to the events this entity handles on an EventBus, overridden by subclasses
+    def subscribe(self, events):
+        pass
+
+    # alpha blends between the last two simulation steps
+    def draw(self, window, alpha=1):
         offset = self.a_offset if not self.flip else self.flipped_a_offset
+        transform = self.previous_transform.lerp(self.transform, alpha)
         if self.debug:
+            rect = window.calculate_scroll_rect(self.rect)
+            k = window.render_scale
             pygame.draw.rect(
-                window.screen, self.debug_color, window.calculate_scroll_rect(self.rect)
+                window.screen, self.debug_color, (rect.x // k, rect.y // k, max(1, rect.w // k), max(1, rect.h // k))
             )
-        window.screen.blit(self.image, window.calculate_scroll(self.transform + offset))
+        window.queue.submit(self.image, transform + offset, self.layer)
 
 
 class Player(Entity):
-    def __init__(self, assets, tag, transform, size, input):
-        super().__init__(assets, tag, transform, size)
+    def __init__(self, assets, tag, transform, size, input, clock=None):
+        super().__init__(assets, tag, transform, size, clock)
         self.input = input
         self.collision_dirs = {
             "bottom": False,
@@ -107,20 +137,44 @@ class Player(Entity):
         }
         # x-axis
         self.direction = Vector2()
-        self.acceleration = 5
-        self.deceleration = 20
-        self.max_speed = 300
-        self.friction = 300
-        self.air_acceleration = 4.5
+        self.acceleration = MOVEMENT["acceleration"]
+        self.deceleration = MOVEMENT["deceleration"]
+        self.max_speed = MOVEMENT["max_speed"]
+        self.friction = MOVEMENT["friction"]
+        self.air_acceleration = MOVEMENT["air_acceleration"]
         # y-axis
         self.jump_buffer = True
-        self.buffer_timer = Timer(0.2)
-        self.air_timer = Timer(0.2)
-        self.gravity = 600
-        self.jump_speed = -320
-        self.max_fall_speed = 500
+        self.buffer_timer = Timer(MOVEMENT["jump_buffer_time"])
+        self.air_timer = Timer(MOVEMENT["coyote_time"])
+        self.gravity = MOVEMENT["gravity"]
+        self.jump_speed = MOVEMENT["jump_speed"]
+        self.max_fall_speed = MOVEMENT["max_fall_speed"]
         self.is_grounded = False
 
+        self.particles = None  # a ParticleSystem for landing dust and running trails, set by the game
+
+    def subscribe(self, events):
+        if isinstance(self.input, Controller):
+            # the controller forwards its events once its stick/button state is updated
+            self.input.listeners.append(self.controller_input)
+            return
+        controls = self.input.controls
+        keys = (controls.move_left, controls.move_right, controls.jump)
+        events.subscribe(pygame.KEYDOWN, self.keyboard_input, keys)
+        events.subscribe(pygame.KEYUP, self.keyboard_input, keys)
+
+    # Swaps between the keyboard and a Controller, e.g. when one is plugged in or unplugged
+    def set_input(self, input):
+        if isinstance(self.input, Controller) and self.controller_input in self.input.listeners:
+            self.input.listeners.remove(self.controller_input)
+        self.input = input
+        if isinstance(input, Controller) and self.controller_input not in input.listeners:
+            input.listeners.append(self.controller_input)
+        # nothing held on the old input carries over
+        for direction in self.directions:
+            self.directions[direction] = False
+        self.direction.x = 0
+
     def event_handler(self, event):
         if isinstance(self.input, Controller):
             self.controller_input(event)
@@ -128,6 +182,9 @@ class Player(Entity):
             self.keyboard_input(event)
 
     def keyboard_input(self, event):
+        # the keys stay subscribed while a controller drives the player
+        if isinstance(self.input, Controller):
+            return
         if event.type == pygame.KEYDOWN:
             if event.key == self.input.controls.move_left:
                 self.directions["left"] = True
@@ -148,12 +205,36 @@ class Player(Entity):
             -1 if self.directions["left"] else 1 if self.directions["right"] else 0
         ) * self.speed
 
+    # Moves with the left stick (digitally, like the keyboard) and jumps with the controls.jump button
+    def controller_input(self, event):
+        if event.type == pygame.JOYAXISMOTION and event.axis == 0:
+            self.directions["left"] = self.input.leftStick.x < 0
+            self.directions["right"] = self.input.leftStick.x > 0
+        elif event.type == pygame.JOYBUTTONDOWN and event.button == self.input.controls.jump:
+            self.jump_buffer = True
+            self.buffer_timer.restart()
+
+        self.direction.x = (
+            -1 if self.directions["left"] else 1 if self.directions["right"] else 0
+        ) * self.speed
+
+    # Each axis is swept against the tile map first so a large step can't pass through a tile,
+    # then anything still overlapping is pushed out as before
     def move(self, dt, tile_map: TileMap):
         collision_dirs = {"bottom": False, "top": False, "left": False, "right": False}
 
         # x-axis
+        start = self.rect.copy()
         self.transform.x += self.movement.x * dt
         self.rect.x = self.transform.x
+        _, tile = tile_map.sweep_test(start, self.rect.x - start.x, 0)
+        if tile:
+            if self.movement.x > 0:
+                self.rect.right = tile.rect.left
+                collision_dirs["right"] = True
+            elif self.movement.x < 0:
+                self.rect.left = tile.rect.right
+                collision_dirs["left"] = True
         tile_collisions = tile_map.collision_test(self.rect)
 
         for tile in tile_collisions:
@@ -167,8 +248,17 @@ class Player(Entity):
         self.transform.x = self.rect.x
 
         # y-axis
+        start = self.rect.copy()
         self.transform.y += self.movement.y * dt
         self.rect.y = self.transform.y
+        _, tile = tile_map.sweep_test(start, 0, self.rect.y - start.y)
+        if tile:
+            if self.movement.y > 0:
+                self.rect.bottom = tile.rect.top
+                collision_dirs["bottom"] = True
+            if self.movement.y < 0:
+                self.rect.top = tile.rect.bottom
+                collision_dirs["top"] = True
         tile_collisions = tile_map.collision_test(self.rect)
 
         for tile in tile_collisions:
@@ -182,19 +272,13 @@ class Player(Entity):
         self.transform.y = self.rect.y
         self.collision_dirs = collision_dirs
 
-    def handle_collision(self, sprite):
-        pass
-
     def animation_states(self):
         if not self.is_grounded:
             self.set_action("jump")
         elif self.direction.x > 0 or self.direction.x < 0:
             self.set_action("run")
             percent = abs(self.movement.x / self.max_speed)
-            if percent == 0:
-                self.animation.duration = 0
-            else:
-                self.animation.duration = self.animation.img_duration / (percent + 0.3)
+            self.playback.set_rate(0 if percent == 0 else percent + 0.3)
         else:
             self.set_action("idle")
 
@@ -204,9 +288,11 @@ class Player(Entity):
         transform.y = transform.y + (self.size.y // 2)
         return transform
 
-    def update(self, dt, tile_map, *groups):
-        super().update(dt, *groups)
-        self.update_animation(dt)
+    def update(self, dt, tile_map):
+        super().update(dt)
+        # collision_dirs["bottom"] flickers while standing still (gravity pushes into the floor every few ticks),
+        # so landing is judged from is_grounded instead
+        was_grounded = self.is_grounded
         self.animation_states()
 
         if not self.is_grounded:
@@ -255,3 +341,15 @@ class Player(Entity):
             self.is_grounded = False
 
         self.move(dt, tile_map)
+        if self.particles is not None:
+            self.emit_particles(not was_grounded and self.collision_dirs["bottom"])
+
+    # Dust when landing (more the harder the fall) and a trail while running fast on the ground
+    def emit_particles(self, landed):
+        feet = (self.transform.x + self.size.x / 2, self.transform.y + self.size.y)
+        if landed:
+            count = int(4 + 12 * abs(self.movement.y) / self.max_fall_speed)
+            self.particles.emit(feet, count, "dust", angle=-math.pi / 2, spread=math.pi / 2, gravity=200)
+        elif self.collision_dirs["bottom"] and abs(self.movement.x) > self.max_speed / 2:
+            angle = math.pi if self.movement.x > 0 else 0
+            self.particles.emit(feet, 1, "trail", angle=angle, spread=0.4, speed=(10, 30), life=(0.1, 0.3))
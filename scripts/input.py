@@ -21,85 +21,172 @@ class Trigger:
         self.activated = False
         self.stop = 0
 
-    def get_trigger(self, joystick):
-        self.number = joystick.get_axis(self.axis)
-
-        # Check if the trigger is pressed beyond the stop threshold
-        if self.number > self.stop:
-            if not self.activated:
-                self.down = True
-            else:
-                self.down = False
+    # Updates the trigger from a JOYAXISMOTION value, posting TRIGGER_DOWN/TRIGGER_UP when it crosses the stop threshold
+    def set_value(self, number, instance_id):
+        self.number = number
+        self.down = False
+        self.up = False
+
+        if self.number > self.stop and not self.activated:
+            self.down = True
             self.activated = True
-            self.up = False
-        elif self.number < self.stop:
-            if self.activated:
-                self.up = True
-                self.activated = False
-            else:
-                self.up = False
-            self.down = False
-        else:
-            self.down = False
-            self.up = False
+            pygame.event.post(pygame.event.Event(TRIGGER_DOWN, instance_id=instance_id, axis=self.axis))
+        elif self.number < self.stop and self.activated:
+            self.up = True
+            self.activated = False
+            pygame.event.post(pygame.event.Event(TRIGGER_UP, instance_id=instance_id, axis=self.axis))
 
 
 class Controller:
     def __init__(self, controls, joystick):
         # parameters
         self.controls = controls
-        self.joystick = joystick
-        self.guid = joystick.get_guid()
-        self.name = joystick.get_name()
+        self.reassign_joystick(joystick)
 
         # controller sticks
         self.leftStick = pygame.math.Vector2()
         self.rightStick = pygame.math.Vector2()
         self.leftTrigger = Trigger(4)
         self.rightTrigger = Trigger(5)
+        self.buttons = set()  # buttons currently held
 
         # attributes
         self.deadzone = 0.1
         self.triggerStop = 0
         self.triggerActivated = False
 
+        # called with every event after the controller state is updated, e.g. Player.controller_input
+        self.listeners = []
+
     # reassigns the joystick to the controller
     def reassign_joystick(self, joystick):
         self.joystick = joystick
+        self.instance_id = joystick.get_instance_id()
         self.guid = joystick.get_guid()
         self.name = joystick.get_name()
 
     # controls the deadzone - input below deadzone value is set to 0 to stop stick drift
-    def control_deadzone(self, deadzone, *axes):
-        newAxes = []
-        for axis in axes:
-            if abs(axis) < deadzone:
-                axis = 0
-            newAxes.append(axis)
-
-        return newAxes
-
-    # calculate sticks movement with deadzone
-    def calculate_sticks(self):
-        leftStick = self.control_deadzone(
-            self.deadzone, self.joystick.get_axis(0), self.joystick.get_axis(1)
-        )
-        rightStick = self.control_deadzone(
-            self.deadzone, self.joystick.get_axis(2), self.joystick.get_axis(3)
-        )
-        self.leftStick.x = leftStick[0]
-        self.leftStick.y = leftStick[1]
-        self.rightStick.x = rightStick[0]
-        self.rightStick.y = rightStick[1]
-
-    def calculate_triggers(self):
-        self.leftTrigger.get_trigger(self.joystick)
-        self.rightTrigger.get_trigger(self.joystick)
-
-    # update the sticks
+    def control_deadzone(self, axis):
+        return 0 if abs(axis) < self.deadzone else axis
+
+    # updates the controller state from one of its joystick events
+    def handle_event(self, event):
+        if event.type == pygame.JOYAXISMOTION:
+            if event.axis == 0:
+                self.leftStick.x = self.control_deadzone(event.value)
+            elif event.axis == 1:
+                self.leftStick.y = self.control_deadzone(event.value)
+            elif event.axis == 2:
+                self.rightStick.x = self.control_deadzone(event.value)
+            elif event.axis == 3:
+                self.rightStick.y = self.control_deadzone(event.value)
+            elif event.axis == self.leftTrigger.axis:
+                self.leftTrigger.set_value(event.value, self.instance_id)
+            elif event.axis == self.rightTrigger.axis:
+                self.rightTrigger.set_value(event.value, self.instance_id)
+        elif event.type == pygame.JOYBUTTONDOWN:
+            self.buttons.add(event.button)
+        elif event.type == pygame.JOYBUTTONUP:
+            self.buttons.discard(event.button)
+
+        for listener in self.listeners:
+            listener(event)
+
+    # state is driven by events, there is nothing to poll
     def update(self):
-        self.calculate_sticks()
-        self.calculate_triggers()
+        pass
+
+
+class ControllerManager:
+    """
+    Keeps a Controller per connected joystick, keyed by instance id, and routes joystick events to it. Controllers are created on JOYDEVICEADDED (sent for already connected joysticks at startup too) and a reconnected joystick gets its old Controller back, matched by GUID. on_connect(controller) and on_disconnect(controller) are called as they come and go, e.g. to hand a controller to a Player.
+    """
+
+    def __init__(self, controls, on_connect=None, on_disconnect=None):
+        self.controls = controls
+        self.controllers = {}  # instance id -> Controller
+        self.disconnected = {}  # guid -> Controller
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+
+    def subscribe(self, events):
+        events.subscribe(pygame.JOYDEVICEADDED, self.device_added)
+        events.subscribe(pygame.JOYDEVICEREMOVED, self.device_removed)
+        for event_type in (pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP):
+            events.subscribe(event_type, self.route)
+
+    def device_added(self, event):
+        joystick = pygame.joystick.Joystick(event.device_index)
+        joystick.init()
+        controller = self.disconnected.pop(joystick.get_guid(), None)
+        if controller:
+            controller.reassign_joystick(joystick)
+        else:
+            controller = Controller(self.controls, joystick)
+        self.controllers[controller.instance_id] = controller
+        logger.info("Controller connected: %s", controller.name)
+        if self.on_connect:
+            self.on_connect(controller)
+
+    def device_removed(self, event):
+        controller = self.controllers.pop(event.instance_id, None)
+        if controller:
+            self.disconnected[controller.guid] = controller
+            logger.info("Controller disconnected: %s", controller.name)
+            if self.on_disconnect:
+                self.on_disconnect(controller)
+
+    def route(self, event):
+        controller = self.controllers.get(event.instance_id)
+        if controller:
+            controller.handle_event(event)
+
+
+class EventBus:
+    """
+    Routes pygame events to the handlers subscribed to their type, so an event only reaches the handlers that care about it. Key events can also be subscribed per key.
+    """
+
+    # event type -> the event attribute handlers can filter on
+    FILTERS = {
+        pygame.KEYDOWN: "key",
+        pygame.KEYUP: "key",
+        pygame.JOYAXISMOTION: "instance_id",
+        pygame.JOYBUTTONDOWN: "instance_id",
+        pygame.JOYBUTTONUP: "instance_id",
+        TRIGGER_DOWN: "instance_id",
+        TRIGGER_UP: "instance_id",
+    }
+
+    def __init__(self):
+        self.handlers = {}  # event type -> [handler]
+        self.filtered = {}  # (event type, value) -> [handler]
+
+    # Calls handler(event) for events of event_type, only for the given values (e.g. keys) if any
+    def subscribe(self, event_type, handler, values=None):
+        if values is None:
+            self.handlers.setdefault(event_type, []).append(handler)
+            return
+        if event_type not in self.FILTERS:
+            raise ValueError(f"{pygame.event.event_name(event_type)} events can't be filtered")
+        for value in values:
+            self.filtered.setdefault((event_type, value), []).append(handler)
+
+    # Removes every handler bound to owner (e.g. an entity that left the game)
+    def unsubscribe(self, owner):
+        for table in (self.handlers, self.filtered):
+            for key in list(table):
+                table[key] = [h for h in table[key] if getattr(h, "__self__", h) is not owner]
+                if not table[key]:
+                    del table[key]
+
+    def dispatch(self, event):
+        for handler in self.handlers.get(event.type, ()):
+            handler(event)
+        attribute = self.FILTERS.get(event.type)
+        if attribute:
+            for handler in self.filtered.get((event.type, getattr(event, attribute, None)), ()):
+                handler(event)
 
 
 class Keyboard:
@@ -1,42 +1,410 @@
 import pygame
+import numpy as np
+from collections import OrderedDict
 from pygame.math import Vector2
 
-class Tile(pygame.sprite.Sprite):
-    def __init__(self, color, transform, size):
-        super().__init__()
+class TilePalette:
+    """
+    Shared tile surfaces, one per distinct (colour, size), so a map of thousands of tiles only holds a surface per tile type. Chunks fill colour tiles straight into their surface, these are only made when a tile is drawn on its own.
+    """
+
+    def __init__(self):
+        self.surfaces = {}  # (colour, (width, height)) -> surface
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def get(self, color, size):
+        key = (tuple(color), (int(size[0]), int(size[1])))
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = pygame.Surface(key[1])
+            surface.fill(color)
+        return surface
+
+
+palette = TilePalette()
+
+
+class Tile:
+    """
+    A static map tile: a rect filled with a colour, or covered by a texture surface shared with every other tile using it.
+    """
+
+    __slots__ = ("color", "rect", "solid", "texture")
+
+    def __init__(self, color, transform, size, solid=True, texture=None):
         self.color = color
-        self.transform = Vector2(transform)
-        self.size = Vector2(size)
+        self.solid = solid  # non-solid tiles are only drawn, their collision comes from merged Colliders
+        self.texture = texture
+
+        # tiles are static so the rect is built once rather than on every lookup
+        self.rect = pygame.Rect(transform[0], transform[1], size[0], size[1])
 
-        self.image = pygame.Surface(self.size)
-        self.image.fill(color)
+    @property
+    def transform(self):
+        return Vector2(self.rect.topleft)
 
-        self.collisions = pygame.sprite.Group()
+    @property
+    def size(self):
+        return Vector2(self.rect.size)
 
     @property
-    def rect(self):
-        return pygame.Rect(self.transform.x, self.transform.y, self.size.x, self.size.y)
+    def image(self):
+        return self.texture or palette.get(self.color, self.rect.size)
 
     def draw(self, window):
         window.screen.blit(self.image, window.calculate_scroll(self.transform))
 
 
-class TileMap(pygame.sprite.Group):
-    def __init__(self):
-        super().__init__()
+# A collision-only rectangle, e.g. a run of solid grid cells merged by merge_cells
+class Collider:
+    __slots__ = ("rect",)
+
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+
+
+# Greedily merges the solid cells of a grid into as few rectangles as it can:
+# each unmerged solid cell grows right as far as it can, then down while every cell in the run is solid.
+# Returns (x, y, width, height) in cells
+def merge_cells(grid, is_solid):
+    height = len(grid)
+    solid = [[is_solid(cell) for cell in row] for row in grid]
+    merged = [[False] * len(row) for row in grid]
+    rects = []
+    for y in range(height):
+        row = solid[y]
+        for x in range(len(row)):
+            if not row[x] or merged[y][x]:
+                continue
+            width = 1
+            while x + width < len(row) and row[x + width] and not merged[y][x + width]:
+                width += 1
+            depth = 1
+            while y + depth < height and all(
+                x + i < len(solid[y + depth]) and solid[y + depth][x + i] and not merged[y + depth][x + i]
+                for i in range(width)
+            ):
+                depth += 1
+            for j in range(y, y + depth):
+                for i in range(x, x + width):
+                    merged[j][i] = True
+            rects.append((x, y, width, depth))
+    return rects
+
+
+EMPTY = ("", "-1", "0")  # grid cells with no tile
+MISSING = (255, 0, 255)  # colour of cells not in the palette
+
+
+# Reads a grid (as returned by load_map) into (colour, position, size, solid) specs for one non-solid
+# tile per cell, and the solid cells merged into (x, y, width, height) collider rects.
+# Only builds tuples, so it can run off the main thread, e.g. on a chunk loader
+def grid_specs(grid, palette, tile_size, origin=(0, 0), empty=EMPTY):
+    specs = []
+    for y, row in enumerate(grid):
+        for x, cell in enumerate(row):
+            cell = cell.strip()
+            if cell not in empty:
+                position = (origin[0] + x * tile_size, origin[1] + y * tile_size)
+                specs.append((palette.get(cell, MISSING), position, (tile_size, tile_size), False))
+
+    rects = [
+        (origin[0] + x * tile_size, origin[1] + y * tile_size, w * tile_size, h * tile_size)
+        for x, y, w, h in merge_cells(grid, lambda cell: cell.strip() not in empty)
+    ]
+    return specs, rects
+
+
+# Returns the (columns, rows) ranges of the size x size grid cells a rect covers
+def cell_range(rect, size):
+    left = rect.left // size
+    top = rect.top // size
+    right = (rect.right - 1) // size
+    bottom = (rect.bottom - 1) // size
+    return range(left, right + 1), range(top, bottom + 1)
+
+
+# Flattens tiles and (possibly nested) iterables of tiles
+def iterate_tiles(tiles):
+    for tile in tiles:
+        if isinstance(tile, Tile):
+            yield tile
+        else:
+            yield from iterate_tiles(tile)
+
+
+class SpatialHash:
+    """
+    A uniform grid of cell_size cells, each holding the items (anything with a rect) overlapping it, so a query only looks at the cells a rect covers.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}  # (cell x, cell y) -> items
+        self.items = {}  # insertion ordered set
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    # Returns the range of cells a rect covers
+    def cell_range(self, rect):
+        return cell_range(rect, self.cell_size)
+
+    def add(self, item):
+        self.items[item] = None
+        columns, rows = self.cell_range(item.rect)
+        for x in columns:
+            for y in rows:
+                self.cells.setdefault((x, y), []).append(item)
+
+    def remove(self, item):
+        del self.items[item]
+        columns, rows = self.cell_range(item.rect)
+        for x in columns:
+            for y in rows:
+                cell = self.cells[(x, y)]
+                cell.remove(item)
+                if not cell:
+                    del self.cells[(x, y)]
+
+    # Returns every item colliding with the rect
+    def query(self, rect):
+        collisions = []
+        seen = set()
+        columns, rows = self.cell_range(rect)
+        for x in columns:
+            for y in rows:
+                for item in self.cells.get((x, y), ()):
+                    if item not in seen:
+                        seen.add(item)
+                        if rect.colliderect(item.rect):
+                            collisions.append(item)
+        return collisions
+
+
+class TileMap:
+    """
+    Holds the tiles of a level. Tiles are kept in a spatial hash for drawing and, when solid, in another one for collision, which also takes collision-only Colliders. Tiles are drawn through render chunks baked on demand.
+    """
+
+    def __init__(self, cell_size=64, chunk_size=256, max_chunks=64):
+        # every tile for drawing, and the solid tiles and colliders for collision
+        self.visuals = SpatialHash(cell_size)
+        self.colliders = SpatialHash(cell_size)
+
+        # array-backed collider bounds (left, top, right, bottom) for batch queries, rebuilt lazily
+        self.bounds = np.empty((0, 4), dtype=np.int64)
+        self.bounds_colliders = []
+        self.bounds_dirty = False
+        self.batch_limit = 1 << 20
+
+        # baked render chunks: (chunk x, chunk y) -> surface (None when empty), least recently used first
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.layer = 1
+
+    def __len__(self):
+        return len(self.visuals)
+
+    def __iter__(self):
+        return iter(list(self.visuals))
+
+    def __contains__(self, tile):
+        return tile in self.visuals.items
+
+    def sprites(self):
+        return list(self.visuals)
 
     @property
     def tiles(self):
         return self.sprites()
 
+    # Like pygame's Group.add, takes tiles or iterables of tiles
+    def add(self, *tiles):
+        for tile in iterate_tiles(tiles):
+            if tile in self.visuals.items:
+                continue
+            self.visuals.add(tile)
+            if tile.solid:
+                self.colliders.add(tile)
+                self.bounds_dirty = True
+            self.invalidate_chunks(tile.rect)
+
+    def remove(self, *tiles):
+        for tile in iterate_tiles(tiles):
+            if tile not in self.visuals.items:
+                continue
+            self.visuals.remove(tile)
+            if tile.solid:
+                self.colliders.remove(tile)
+                self.bounds_dirty = True
+            self.invalidate_chunks(tile.rect)
+
+    def has(self, *tiles):
+        return all(tile in self.visuals.items for tile in iterate_tiles(tiles))
+
+    def empty(self):
+        self.remove(self.sprites())
+
+    def add_colliders(self, *colliders):
+        for collider in colliders:
+            self.colliders.add(collider)
+        self.bounds_dirty = True
+
+    def remove_colliders(self, *colliders):
+        for collider in colliders:
+            self.colliders.remove(collider)
+        self.bounds_dirty = True
+
+    # Adds a grid (as returned by load_map) of cells: one non-solid tile per cell for drawing,
+    # and the solid cells merged into Colliders. Returns (tiles, colliders)
+    def bake_grid(self, grid, palette, tile_size, origin=(0, 0), empty=EMPTY):
+        specs, rects = grid_specs(grid, palette, tile_size, origin, empty)
+        tiles = [Tile(*spec) for spec in specs]
+        colliders = [Collider(rect) for rect in rects]
+        self.add(tiles)
+        self.add_colliders(*colliders)
+        return tiles, colliders
+
+    # Returns the range of render chunks a rect covers
+    def chunk_range(self, rect):
+        return cell_range(rect, self.chunk_size)
+
+    # Drops baked chunks that a changed rect touches so they are rebaked on the next draw
+    def invalidate_chunks(self, rect):
+        columns, rows = self.chunk_range(rect)
+        if len(columns) * len(rows) > len(self.chunks):
+            for key in [k for k in self.chunks if k[0] in columns and k[1] in rows]:
+                del self.chunks[key]
+        else:
+            for x in columns:
+                for y in rows:
+                    self.chunks.pop((x, y), None)
+
+    # Pre-renders every tile overlapping a chunk into one surface
+    def bake_chunk(self, key):
+        area = pygame.Rect(
+            key[0] * self.chunk_size, key[1] * self.chunk_size, self.chunk_size, self.chunk_size
+        )
+        tiles = self.visuals.query(area)
+        if not tiles:
+            return None
+
+        # colour tiles are filled straight in, only textured tiles are blitted
+        surface = pygame.Surface(area.size, pygame.SRCALPHA)
+        for tile in tiles:
+            position = (tile.rect.x - area.x, tile.rect.y - area.y)
+            if tile.texture:
+                surface.blit(tile.texture, position)
+            else:
+                surface.fill(tile.color, (position, tile.rect.size))
+        return surface
+
+    def get_chunk(self, key):
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        surface = self.bake_chunk(key)
+        self.chunks[key] = surface
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    # Only draws the baked chunks that overlap the camera
     def draw(self, window):
-        for tile in self.tiles:
-            tile.draw(window)
+        columns, rows = self.chunk_range(window.camera)
+        for x in columns:
+            for y in rows:
+                surface = self.get_chunk((x, y))
+                if surface:
+                    window.queue.submit(surface, (x * self.chunk_size, y * self.chunk_size), self.layer)
 
+    # Returns every solid tile and collider colliding with the rect, only checking the cells it overlaps
     def collision_test(self, rect):
-        collisions = []
-        for tile in self.tiles:
-            if rect.colliderect(tile):
-                collisions.append(tile)
-        return collisions
+        return self.colliders.query(rect)
+
+    # Swept AABB test of rect moving by (dx, dy) over one step. Returns (time of impact from 0 to 1, tile)
+    # for the first solid tile or collider it would run into, or (1, None). Tiles it already overlaps are ignored
+    def sweep_test(self, rect, dx, dy):
+        first_time, first_tile = 1, None
+        for tile in self.collision_test(rect.union(rect.move(dx, dy))):
+            entry, leave = 0, 1
+            for delta, near, far, tile_near, tile_far in (
+                (dx, rect.left, rect.right, tile.rect.left, tile.rect.right),
+                (dy, rect.top, rect.bottom, tile.rect.top, tile.rect.bottom),
+            ):
+                if delta > 0:
+                    entry = max(entry, (tile_near - far) / delta)
+                    leave = min(leave, (tile_far - near) / delta)
+                elif delta < 0:
+                    entry = max(entry, (tile_far - near) / delta)
+                    leave = min(leave, (tile_near - far) / delta)
+                elif not (near < tile_far and tile_near < far):
+                    entry, leave = 1, 0
+            # only tiles that start ahead of the rect: overlapping ones have an entry time below 0
+            if entry < leave and entry < first_time and not rect.colliderect(tile.rect):
+                first_time, first_tile = entry, tile
+        return first_time, first_tile
+
+    def update_bounds(self):
+        self.bounds_colliders = list(self.colliders)
+        self.bounds = np.array(
+            [(c.rect.left, c.rect.top, c.rect.right, c.rect.bottom) for c in self.bounds_colliders],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+        self.bounds_dirty = False
+
+    # Returns the colliding tiles and colliders for each rect in one vectorized pass
+    def collision_test_many(self, rects):
+        queries = np.array(
+            [(r.left, r.top, r.right, r.bottom) for r in rects], dtype=np.int64
+        ).reshape(-1, 4)
+        return self.collision_test_bounds(queries)
+
+    # Same as collision_test_many for an (n, 4) array of (left, top, right, bottom) rows
+    def collision_test_bounds(self, queries):
+        hits = [[] for _ in range(len(queries))]
+        if not len(queries):
+            return hits
+        if self.bounds_dirty:
+            self.update_bounds()
+
+        # ignore empty rects, colliderect never reports them
+        valid = (queries[:, 2] > queries[:, 0]) & (queries[:, 3] > queries[:, 1])
+        if not valid.any() or not len(self.bounds):
+            return hits
+
+        # cull the tiles against the area covered by every query first
+        area = queries[valid]
+        bounds = self.bounds
+        near = np.flatnonzero(
+            (bounds[:, 0] < area[:, 2].max())
+            & (bounds[:, 2] > area[:, 0].min())
+            & (bounds[:, 1] < area[:, 3].max())
+            & (bounds[:, 3] > area[:, 1].min())
+        )
+        if not len(near):
+            return hits
 
+        near_bounds = bounds[near]
+        # compare in blocks of queries so the overlap matrix stays small on spread out queries
+        block = max(1, self.batch_limit // len(near))
+        for start in range(0, len(queries), block):
+            chunk = queries[start:start + block]
+            overlap = (
+                (chunk[:, None, 0] < near_bounds[None, :, 2])
+                & (chunk[:, None, 2] > near_bounds[None, :, 0])
+                & (chunk[:, None, 1] < near_bounds[None, :, 3])
+                & (chunk[:, None, 3] > near_bounds[None, :, 1])
+                & valid[start:start + block, None]
+            )
+            for query, tile in zip(*np.nonzero(overlap)):
+                hits[start + query].append(self.bounds_colliders[near[tile]])
+        return hits
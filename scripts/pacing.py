@@ -0,0 +1,70 @@
+# Modules
+import pygame
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FramePacer:
+    """
+    Caps the frame rate at target_fps and keeps a moving average of how long each frame took to produce, not counting the time the clock slept. When the average runs over the frame budget the window's render scale is raised, so the same view of the world is rendered at 1/2, 1/3... of the native resolution and scaled back up, and once there is headroom again it is lowered back to full resolution.
+
+    A change only happens after cooldown seconds since the last one, and the render scale is only lowered when the cost scaled up to the bigger surface would still fit in headroom of the budget, so it doesn't flip back and forth between two scales.
+    """
+
+    def __init__(self, window, target_fps=120, max_render_scale=2, smoothing=0.05, headroom=0.7, cooldown=2.0, enabled=True):
+        self.window = window
+        self.clock = pygame.time.Clock()
+        self.target_fps = target_fps
+        self.max_render_scale = max_render_scale
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.cooldown = cooldown
+        self.enabled = enabled
+
+        self.average = 0  # ms of work per frame
+        self.since_change = 0
+
+    # ms a frame may take at the target frame rate
+    @property
+    def budget(self):
+        return 1000 / self.target_fps
+
+    # Waits out the rest of the frame and returns the ms since the last call, like Clock.tick
+    def tick(self):
+        elapsed = self.clock.tick(self.target_fps)
+        work = self.clock.get_rawtime()
+        # the first frames include startup, so start the average from them rather than from 0
+        if self.average:
+            self.average += (work - self.average) * self.smoothing
+        else:
+            self.average = work
+        self.since_change += elapsed / 1000
+
+        if self.enabled and self.since_change >= self.cooldown:
+            self.adjust()
+        return elapsed
+
+    def adjust(self):
+        render_scale = self.window.render_scale
+        if self.average > self.budget and render_scale < self.max_render_scale:
+            self.set_render_scale(render_scale + 1)
+        elif render_scale > 1:
+            # work roughly follows the number of pixels drawn
+            predicted = self.average * (render_scale / (render_scale - 1)) ** 2
+            if predicted < self.budget * self.headroom:
+                self.set_render_scale(render_scale - 1)
+
+    def set_render_scale(self, render_scale):
+        logger.info(
+            "Frame cost %.1f ms (budget %.1f ms), render scale 1/%d -> 1/%d",
+            self.average,
+            self.budget,
+            self.window.render_scale,
+            render_scale,
+        )
+        self.window.set_render_scale(render_scale)
+        self.since_change = 0
+
+    def get_fps(self):
+        return self.clock.get_fps()
@@ -0,0 +1,123 @@
+# Modules
+import pygame
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+FADE_STEPS = 4  # alpha levels a particle fades through over its life
+
+# name -> (colour, size in pixels)
+STYLES = {
+    "dust": ((170, 160, 150), 2),
+    "trail": ((220, 220, 220), 1),
+    "switch": ((120, 200, 255), 2),
+}
+
+
+class ParticleSystem:
+    """
+    Particles stored in preallocated NumPy arrays (position, velocity, gravity, life, style), integrated for all of them at once. Dead particles are compacted out each update so the live ones are always the first count rows.
+
+    Particles are a few pixels each, so rather than blitting one surface per particle they are written into a canvas the size of the window's screen with NumPy: every particle is offset by the camera in one go and its pixels set to its style's colour, at one of FADE_STEPS alpha levels as it dies. The canvas is then submitted to the render queue and blitted with one call. Particles past capacity are dropped.
+    """
+
+    def __init__(self, capacity=65536, styles=STYLES, layer=2, seed=None):
+        self.capacity = capacity
+        self.layer = layer
+        self.rng = np.random.default_rng(seed)
+
+        self.position = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.gravity = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.max_life = np.ones(capacity, dtype=np.float32)
+        self.style = np.zeros(capacity, dtype=np.int32)
+        self.count = 0
+
+        self.style_ids = {name: i for i, name in enumerate(styles)}
+        self.colors = np.array([color for color, _ in styles.values()], dtype=np.uint8).reshape(-1, 3)
+        self.sizes = np.array([size for _, size in styles.values()], dtype=np.int32)
+        self.canvas = None
+
+    def __len__(self):
+        return self.count
+
+    # Emits count particles at a point, flying at speed (min, max) in directions within
+    # spread radians of angle (0 is right, y grows downwards), living life (min, max) seconds
+    def emit(self, position, count, style="dust", angle=0, spread=np.pi, speed=(20, 60), life=(0.2, 0.5), gravity=0):
+        count = min(count, self.capacity - self.count)
+        if count <= 0:
+            return
+        rows = slice(self.count, self.count + count)
+        angles = angle + self.rng.uniform(-spread, spread, count)
+        speeds = self.rng.uniform(speed[0], speed[1], count)
+        self.position[rows] = position
+        self.velocity[rows, 0] = np.cos(angles) * speeds
+        self.velocity[rows, 1] = np.sin(angles) * speeds
+        self.gravity[rows] = gravity
+        self.life[rows] = self.max_life[rows] = self.rng.uniform(life[0], life[1], count)
+        self.style[rows] = self.style_ids[style]
+        self.count += count
+
+    # Emits particles in every direction, e.g. for a time switch
+    def burst(self, position, count=64, style="switch", speed=(40, 120), life=(0.3, 0.7)):
+        self.emit(position, count, style, spread=np.pi, speed=speed, life=life)
+
+    def update(self, dt):
+        count = self.count
+        if not count:
+            return
+        velocity = self.velocity[:count]
+        velocity[:, 1] += self.gravity[:count] * dt
+        self.position[:count] += velocity * dt
+        life = self.life[:count]
+        life -= dt
+
+        alive = life > 0
+        if not alive.all():
+            live = np.flatnonzero(alive)
+            for column in (self.position, self.velocity, self.gravity, self.life, self.max_life, self.style):
+                column[:len(live)] = column[live]
+            self.count = len(live)
+
+    def clear(self):
+        self.count = 0
+
+    # Draws the particles on the camera's screen into the canvas and queues it
+    def draw(self, window):
+        count = self.count
+        if not count:
+            return
+        size = (int(window.render_size.x), int(window.render_size.y))
+        if self.canvas is None or self.canvas.get_size() != size:
+            self.canvas = pygame.Surface(size, pygame.SRCALPHA)
+            # style * FADE_STEPS + fade step -> the pixel value written for it
+            self.pixels = np.array(
+                [
+                    self.canvas.map_rgb((*color, 255 * (step + 1) // FADE_STEPS))
+                    for color in self.colors.tolist()
+                    for step in range(FADE_STEPS)
+                ],
+                dtype=np.int64,
+            )
+        self.canvas.fill((0, 0, 0, 0))
+
+        scroll = window.scroll
+        screen = np.floor((self.position[:count] - (scroll.x, scroll.y)) / window.render_scale).astype(np.int32)
+        style = self.style[:count]
+        steps = np.minimum((self.life[:count] / self.max_life[:count] * FADE_STEPS).astype(np.int32), FADE_STEPS - 1)
+        values = self.pixels[style * FADE_STEPS + steps]
+        sizes = self.sizes[style]
+
+        pixels = pygame.surfarray.pixels2d(self.canvas)
+        for dy in range(int(sizes.max())):
+            for dx in range(int(sizes.max())):
+                x = screen[:, 0] + dx
+                y = screen[:, 1] + dy
+                inside = np.flatnonzero((sizes > max(dx, dy)) & (x >= 0) & (x < size[0]) & (y >= 0) & (y < size[1]))
+                pixels[x[inside], y[inside]] = values[inside]
+        # the pixel array locks the canvas until it is released
+        del pixels
+
+        window.queue.submit_batch([(self.canvas, (0, 0))], self.layer)
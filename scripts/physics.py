@@ -0,0 +1,246 @@
+# Modules
+import numpy as np
+import pygame
+
+# Scripts
+from scripts.entity import MOVEMENT
+
+# default movement constants, the same values Player starts with
+DEFAULTS = dict(MOVEMENT)
+
+FLOAT_COLUMNS = ("x", "y", "width", "height", "vx", "vy", "direction", "air_time", "buffer_time", *DEFAULTS)
+BOOL_COLUMNS = ("grounded", "jump", "hit_bottom", "hit_top", "flip")
+
+
+# Rounds like pygame.Rect does when given a float (halves away from zero)
+def rect_round(values):
+    return np.copysign(np.floor(np.abs(values) + 0.5), values)
+
+
+class EntityStore:
+    """
+    Struct-of-arrays physics for many entities. Positions, velocities and movement constants live in NumPy columns and every entity is integrated at once with the same rules as Player.update and Player.move. Entities keep their own transform, rect, movement, flip and is_grounded, which are written back after each update. State changed on the entities directly (e.g. by a rewind) has to be read back with sync.
+
+    AI drives an entity through set_direction (the same as Player.direction.x, i.e. -speed, 0 or speed) and jump.
+    """
+
+    def __init__(self, capacity=64):
+        self.entities = []
+        self.index = {}  # entity -> row
+        self.columns = {}
+        for name in FLOAT_COLUMNS:
+            self.columns[name] = np.zeros(capacity, dtype=np.float64)
+        for name in BOOL_COLUMNS:
+            self.columns[name] = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity):
+        return entity in self.index
+
+    # Returns the live rows of a column, e.g. store.column("vx")
+    def column(self, name):
+        return self.columns[name][: len(self.entities)]
+
+    def grow(self):
+        for name, column in self.columns.items():
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[: len(column)] = column
+            self.columns[name] = grown
+
+    def add(self, *entities):
+        for entity in entities:
+            if entity in self.index:
+                continue
+            row = len(self.entities)
+            if row == len(self.columns["x"]):
+                self.grow()
+            self.entities.append(entity)
+            self.index[entity] = row
+
+            columns = self.columns
+            columns["x"][row] = entity.transform.x
+            columns["y"][row] = entity.transform.y
+            columns["width"][row] = entity.rect.width
+            columns["height"][row] = entity.rect.height
+            columns["vx"][row] = entity.movement.x
+            columns["vy"][row] = entity.movement.y
+            columns["direction"][row] = 0
+            columns["air_time"][row] = 0
+            columns["buffer_time"][row] = 0
+            for name, default in DEFAULTS.items():
+                columns[name][row] = getattr(entity, name, default)
+            for name in BOOL_COLUMNS:
+                columns[name][row] = False
+            columns["flip"][row] = entity.flip
+            entity.is_grounded = False
+
+    # Removes an entity by moving the last row into its place
+    def remove(self, *entities):
+        for entity in entities:
+            row = self.index.pop(entity)
+            last = len(self.entities) - 1
+            moved = self.entities.pop()
+            if row != last:
+                self.entities[row] = moved
+                self.index[moved] = row
+                for column in self.columns.values():
+                    column[row] = column[last]
+
+    # Reads state written onto entities from outside (e.g. by RewindBuffer.restore) back into the columns.
+    # Collision flags are cleared and an entity on the ground gets its full coyote time again
+    def sync(self, *entities):
+        columns = self.columns
+        for entity in entities:
+            row = self.index[entity]
+            columns["x"][row] = entity.transform.x
+            columns["y"][row] = entity.transform.y
+            columns["vx"][row] = entity.movement.x
+            columns["vy"][row] = entity.movement.y
+            columns["flip"][row] = entity.flip
+            columns["grounded"][row] = entity.is_grounded
+            columns["air_time"][row] = 0 if entity.is_grounded else columns["coyote_time"][row]
+            columns["hit_bottom"][row] = columns["hit_top"][row] = columns["jump"][row] = False
+
+    def set_direction(self, entity, direction):
+        self.columns["direction"][self.index[entity]] = direction
+
+    # Buffers a jump like Player's jump_buffer: it happens on a grounded tick within jump_buffer_time
+    def jump(self, entity):
+        row = self.index[entity]
+        self.columns["jump"][row] = True
+        self.columns["buffer_time"][row] = 0
+
+    def update(self, dt, tile_map=None):
+        n = len(self.entities)
+        if not n:
+            return
+        c = {name: column[:n] for name, column in self.columns.items()}
+        vx, vy, direction = c["vx"], c["vy"], c["direction"]
+        grounded, max_speed = c["grounded"], c["max_speed"]
+
+        # horizontal: air control, turning, accelerating, then friction when there is no input
+        airborne = ~grounded
+        turning = grounded & (((direction < 0) & (vx > 0)) | ((direction > 0) & (vx < 0)))
+        accelerating = grounded & ~turning & (direction != 0)
+        rate = np.where(airborne, c["air_acceleration"], np.where(turning, c["deceleration"], c["acceleration"]))
+        driven = airborne | turning | accelerating
+        driven_vx = np.clip(vx + direction * rate * dt, -max_speed, max_speed)
+
+        friction = c["friction"] * dt
+        slowed_vx = np.where(np.abs(vx) <= friction, 0, vx - friction * np.sign(vx))
+        vx[:] = np.where(driven, driven_vx, slowed_vx)
+
+        c["flip"][vx > 0] = False
+        c["flip"][vx < 0] = True
+
+        # vertical
+        jumping = c["jump"] & grounded & (c["buffer_time"] < c["jump_buffer_time"])
+        vy[jumping] = c["jump_speed"][jumping]
+        grounded[jumping] = False
+
+        landed = c["hit_bottom"]
+        vy[landed | c["hit_top"]] = 0
+        grounded[landed] = True
+        c["air_time"][landed] = 0
+
+        vy[:] = np.clip(vy + c["gravity"] * dt, -c["max_fall_speed"], c["max_fall_speed"])
+
+        c["air_time"] += dt
+        c["buffer_time"] += dt
+        grounded[c["air_time"] >= c["coyote_time"]] = False
+
+        self.move(dt, tile_map, c)
+        self.write_back(c)
+
+    # Moves each axis in turn and pushes entities out of the tiles they hit, like Player.move
+    def move(self, dt, tile_map, c):
+        x, y, vx, vy = c["x"], c["y"], c["vx"], c["vy"]
+        c["hit_bottom"][:] = False
+        c["hit_top"][:] = False
+
+        start = x.copy()
+        x[:] = rect_round(x + vx * dt)
+        if tile_map is not None:
+            for row, tile in self.sweeps(tile_map, c, start, y):
+                rect = self.entities[row].rect
+                rect.topleft = (x[row], y[row])
+                if vx[row] > 0:
+                    rect.right = tile.rect.left
+                elif vx[row] < 0:
+                    rect.left = tile.rect.right
+                x[row] = rect.x
+            for row, hits in self.collisions(tile_map, c):
+                rect = self.entities[row].rect
+                rect.topleft = (x[row], y[row])
+                for tile in hits:
+                    if vx[row] > 0:
+                        rect.right = tile.rect.left
+                    elif vx[row] < 0:
+                        rect.left = tile.rect.right
+                x[row] = rect.x
+
+        start = y.copy()
+        y[:] = rect_round(y + vy * dt)
+        if tile_map is not None:
+            for row, tile in self.sweeps(tile_map, c, x, start):
+                rect = self.entities[row].rect
+                rect.topleft = (x[row], y[row])
+                if vy[row] > 0:
+                    rect.bottom = tile.rect.top
+                    c["hit_bottom"][row] = True
+                if vy[row] < 0:
+                    rect.top = tile.rect.bottom
+                    c["hit_top"][row] = True
+                y[row] = rect.y
+            for row, hits in self.collisions(tile_map, c):
+                rect = self.entities[row].rect
+                rect.topleft = (x[row], y[row])
+                for tile in hits:
+                    if vy[row] > 0:
+                        rect.bottom = tile.rect.top
+                        c["hit_bottom"][row] = True
+                    if vy[row] < 0:
+                        rect.top = tile.rect.bottom
+                        c["hit_top"][row] = True
+                y[row] = rect.y
+
+    # Returns (row, tile) for every entity that runs into a tile on its way from (start_x, start_y)
+    # to its current position, the same swept test as Player.move
+    def sweeps(self, tile_map, c, start_x, start_y):
+        x, y, width, height = c["x"], c["y"], c["width"], c["height"]
+        left, top = np.minimum(start_x, x), np.minimum(start_y, y)
+        right, bottom = np.maximum(start_x, x) + width, np.maximum(start_y, y) + height
+        bounds = np.stack((left, top, right, bottom), axis=1).astype(np.int64)
+        found = []
+        for row, hits in enumerate(tile_map.collision_test_bounds(bounds)):
+            if not hits:
+                continue
+            start = pygame.Rect(int(start_x[row]), int(start_y[row]), int(width[row]), int(height[row]))
+            _, tile = tile_map.sweep_test(start, int(x[row] - start_x[row]), int(y[row] - start_y[row]))
+            if tile:
+                found.append((row, tile))
+        return found
+
+    # Returns (row, hits) for every entity overlapping the tile map at its current position
+    def collisions(self, tile_map, c):
+        bounds = np.stack((c["x"], c["y"], c["x"] + c["width"], c["y"] + c["height"]), axis=1).astype(np.int64)
+        return [(row, hits) for row, hits in enumerate(tile_map.collision_test_bounds(bounds)) if hits]
+
+    def write_back(self, c):
+        for entity, x, y, vx, vy, flip, grounded in zip(
+            self.entities,
+            c["x"].tolist(),
+            c["y"].tolist(),
+            c["vx"].tolist(),
+            c["vy"].tolist(),
+            c["flip"].tolist(),
+            c["grounded"].tolist(),
+        ):
+            entity.previous_transform.update(entity.transform)
+            entity.transform.update(x, y)
+            entity.rect.topleft = (x, y)
+            entity.movement.update(vx, vy)
+            entity.flip = flip
+            entity.is_grounded = grounded
@@ -0,0 +1,121 @@
+# Modules
+import pygame
+import json
+import mmap
+import os
+import struct
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TSPIXEL1"
+HEADER = struct.Struct("<8sQ")  # magic, index length
+
+
+class PixelCache:
+    """
+    An on-disk cache of decoded RGBA pixels kept in one memory-mapped file, so warm starts build surfaces straight from the mapped bytes instead of decompressing PNGs. Entries are keyed by path and only used while the file's mtime and size still match.
+
+    File layout: header, JSON index of {path: [mtime_ns, size, width, height, offset, length]}, then the pixel data.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.added = {}  # path -> (mtime_ns, size, width, height, pixels) decoded this run
+        self.lock = threading.Lock()
+        self.file = None
+        self.map = None
+        self.data_start = 0
+        self.open()
+
+    def open(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            self.file = open(self.path, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, index_length = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError("not a pixel cache")
+            self.entries = json.loads(self.map[HEADER.size:HEADER.size + index_length])
+            self.data_start = HEADER.size + index_length
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Ignoring unreadable pixel cache %s: %s", self.path, e)
+            self.close()
+            self.entries = {}
+
+    def close(self):
+        if self.map:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # surfaces still use the mapping, it is unmapped once they are gone
+        if self.file:
+            self.file.close()
+        self.map = None
+        self.file = None
+
+    # Returns the decoded surface for an image, from the cache when it is still fresh
+    def load(self, path):
+        key = os.path.normpath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(key)
+        if self.map and entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            width, height, offset, length = entry[2:]
+            start = self.data_start + offset
+            return pygame.image.frombuffer(memoryview(self.map)[start:start + length], (width, height), "RGBA")
+
+        img = pygame.image.load(path)
+        pixels = pygame.image.tobytes(img, "RGBA")
+        with self.lock:
+            self.added[key] = (stat.st_mtime_ns, stat.st_size, img.get_width(), img.get_height(), pixels)
+        return img
+
+    # Writes fresh entries (old and new) back to disk, dropping any whose file changed or disappeared
+    def save(self):
+        with self.lock:
+            added = dict(self.added)
+        if not added and all(self.is_fresh(key, entry) for key, entry in self.entries.items()):
+            return
+
+        index = {}
+        blocks = []
+        offset = 0
+        for key, entry in self.entries.items():
+            if key in added or not self.is_fresh(key, entry):
+                continue
+            start = self.data_start + entry[4]
+            blocks.append(self.map[start:start + entry[5]])
+            index[key] = entry[:4] + [offset, entry[5]]
+            offset += entry[5]
+        for key, (mtime, size, width, height, pixels) in added.items():
+            blocks.append(pixels)
+            index[key] = [mtime, size, width, height, offset, len(pixels)]
+            offset += len(pixels)
+
+        index_bytes = json.dumps(index).encode()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # write beside the old file and swap, surfaces still mapped from the old file stay valid
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(index_bytes)))
+            file.write(index_bytes)
+            for block in blocks:
+                file.write(block)
+        os.replace(temp_path, self.path)
+        logger.info("Saved %d images to pixel cache %s", len(index), self.path)
+
+        self.close()
+        with self.lock:
+            for key in added:
+                self.added.pop(key, None)
+        self.open()
+
+    def is_fresh(self, key, entry):
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return False
+        return entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size
@@ -0,0 +1,159 @@
+# Modules
+import pygame
+import csv
+import json
+import logging
+from array import array
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+FRAME = "frame"
+
+
+class Profiler:
+    """
+    Records how long each phase of a frame takes into preallocated ring buffers. Every recording method returns straight away while disabled, so the instrumentation can stay in the game loop.
+
+    profiler.begin("update")
+    ...
+    profiler.end("update")
+    profiler.end_frame()
+    """
+
+    def __init__(self, capacity=600, enabled=False, entity_scopes=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.entity_scopes = entity_scopes  # also time each entity's update/draw
+
+        self.samples = {}  # phase -> ring buffer of milliseconds
+        self.counts = {}  # phase -> samples written
+        self.starts = {}
+        self.frame_start = None
+
+    def buffer(self, phase):
+        if phase not in self.samples:
+            self.samples[phase] = array("d", bytes(8 * self.capacity))
+            self.counts[phase] = 0
+        return self.samples[phase]
+
+    def record(self, phase, ms):
+        samples = self.buffer(phase)
+        samples[self.counts[phase] % self.capacity] = ms
+        self.counts[phase] += 1
+
+    def begin(self, phase):
+        if not self.enabled:
+            return
+        now = perf_counter()
+        if self.frame_start is None:
+            self.frame_start = now
+        self.starts[phase] = now
+
+    # Phases that began while the profiler was off (e.g. toggled on mid frame) are skipped
+    def end(self, phase):
+        if not self.enabled:
+            return
+        start = self.starts.pop(phase, None)
+        if start is not None:
+            self.record(phase, (perf_counter() - start) * 1000)
+
+    # Closes the current frame, recording the time since its first phase began
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        self.record(FRAME, (perf_counter() - self.frame_start) * 1000)
+        self.frame_start = None
+
+    # Scopes for a single entity, e.g. "update:player"
+    def begin_entity(self, scope, entity):
+        if self.enabled and self.entity_scopes:
+            self.starts[(scope, id(entity))] = perf_counter()
+
+    def end_entity(self, scope, entity):
+        if self.enabled and self.entity_scopes:
+            start = self.starts.pop((scope, id(entity)), None)
+            if start is not None:
+                self.record(f"{scope}:{entity.tag}", (perf_counter() - start) * 1000)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.starts.clear()
+        self.frame_start = None
+
+    def clear(self):
+        self.samples.clear()
+        self.counts.clear()
+        self.starts.clear()
+        self.frame_start = None
+
+    # Returns the recorded samples of a phase, oldest first
+    def history(self, phase):
+        if phase not in self.samples:
+            return []
+        samples, count = self.samples[phase], self.counts[phase]
+        if count <= self.capacity:
+            return samples[:count].tolist()
+        start = count % self.capacity
+        return (samples[start:] + samples[:start]).tolist()
+
+    def percentile(self, phase, percent):
+        values = sorted(self.history(phase))
+        if not values:
+            return 0
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+    # Returns {phase: {"p50", "p95", "p99", "max", "samples"}}
+    def report(self):
+        report = {}
+        for phase in self.samples:
+            values = sorted(self.history(phase))
+            report[phase] = {
+                "p50": values[int(len(values) * 0.50)],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+                "max": values[-1],
+                "samples": len(values),
+            }
+        return report
+
+    def export_json(self, filename):
+        with open(filename, "w") as file:
+            json.dump(
+                {"report": self.report(), "samples": {phase: self.history(phase) for phase in self.samples}},
+                file,
+                indent=2,
+            )
+        logger.info("Profile exported to %s", filename)
+
+    # One row per sample index, one column per phase
+    def export_csv(self, filename):
+        phases = list(self.samples)
+        histories = [self.history(phase) for phase in phases]
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["sample", *phases])
+            for i in range(max(map(len, histories), default=0)):
+                writer.writerow([i, *(h[i] if i < len(h) else "" for h in histories)])
+        logger.info("Profile exported to %s", filename)
+
+    # Draws the recent frame times as a bar graph in screen space, with a line at the frame budget
+    def draw(self, window, budget=1000 / 60, size=(120, 40), color=(0, 200, 0), over_color=(220, 0, 0)):
+        if not self.enabled:
+            return
+        width, height = size
+        graph = pygame.Rect(window.screen.get_width() - width - 2, 2, width, height)
+        window.screen.fill((0, 0, 0), graph)
+
+        scale = height / (budget * 2)
+        history = self.history(FRAME)[-width:]
+        for x, ms in enumerate(history):
+            bar = min(height, int(ms * scale))
+            pygame.draw.line(
+                window.screen,
+                over_color if ms > budget else color,
+                (graph.left + x, graph.bottom - 1),
+                (graph.left + x, graph.bottom - bar),
+            )
+        budget_y = graph.bottom - int(budget * scale)
+        pygame.draw.line(window.screen, (255, 255, 255), (graph.left, budget_y), (graph.right - 1, budget_y))
@@ -1,20 +1,83 @@
+import math
+import weakref
+
 import pygame
 from pygame.math import Vector2
 
 
+class RenderQueue:
+    """
+    Collects (surface, world position) entries by layer during a frame. Flushing applies the camera offset once for the whole frame and submits each layer, lowest first, with a single blits call. Entries on the same layer keep the order they were submitted in. Batches already in screen space (e.g. particles, offset with NumPy) are blitted as they are after the layer's entries.
+
+    When the screen is rendered at 1/divisor of the native resolution, entries are blitted from downscaled copies of their surfaces, made once per surface and dropped with it.
+    """
+
+    def __init__(self):
+        self.layers = {}  # layer -> [(surface, (x, y))]
+        self.batches = {}  # layer -> [[(surface, (screen x, screen y))]]
+        self.scaled = weakref.WeakKeyDictionary()  # surface -> (divisor, downscaled surface)
+
+    def submit(self, surface, position, layer=0):
+        entries = self.layers.get(layer)
+        if entries is None:
+            entries = self.layers[layer] = []
+        entries.append((surface, (position[0], position[1])))
+
+    # Queues a sequence of (surface, screen position) pairs to be blitted in one call
+    def submit_batch(self, sequence, layer=0):
+        self.batches.setdefault(layer, []).append(sequence)
+        self.layers.setdefault(layer, [])
+
+    def flush(self, screen, scroll, divisor=1):
+        sx, sy = scroll
+        for layer in sorted(self.layers):
+            entries = self.layers[layer]
+            if entries:
+                if divisor == 1:
+                    sequence = [(surface, (x - sx, y - sy)) for surface, (x, y) in entries]
+                else:
+                    sequence = [
+                        (self.downscaled(surface, divisor), ((x - sx) // divisor, (y - sy) // divisor))
+                        for surface, (x, y) in entries
+                    ]
+                self.blits(screen, sequence)
+                entries.clear()
+            for sequence in self.batches.pop(layer, ()):
+                self.blits(screen, sequence)
+
+    def downscaled(self, surface, divisor):
+        entry = self.scaled.get(surface)
+        if entry is not None and entry[0] == divisor:
+            return entry[1]
+        width, height = surface.get_size()
+        scaled = pygame.transform.scale(surface, (max(1, width // divisor), max(1, height // divisor)))
+        colorkey = surface.get_colorkey()
+        if colorkey:
+            scaled.set_colorkey(colorkey)
+        self.scaled[surface] = (divisor, scaled)
+        return scaled
+
+    @staticmethod
+    def blits(screen, sequence):
+        if hasattr(screen, "fblits"):
+            screen.fblits(sequence)
+        else:
+            screen.blits(sequence, doreturn=False)
+
+
 class Window:
     """
     A class that manages the drawing of the window. This allows for pixel art to be easily upscaled. This class has 2 cameras. A world camera and a foreground camera. The world camera should be for entities in the world which are affected by scale. The foreground camera should be for elements like the cursor.
     """
 
-    def __init__(self, resolution, scale, flags=None):
+    def __init__(self, resolution, scale, flags=0):
         self.flags = flags
         self.set_resolution(resolution, scale)
-
-        self.display = pygame.display.set_mode(self.native_resolution, flags=pygame.FULLSCREEN | pygame.SCALED)
-        self.screen = pygame.Surface(self.native_resolution)
+        self.queue = RenderQueue()
 
         self.true_scroll = Vector2(0, 0)  # Floating-point camera position
+        self.previous_scroll = Vector2(0, 0)  # camera position on the previous simulation step
+        self.render_scroll = Vector2(0, 0)  # camera position interpolated for drawing
         self.target = None
         self.pan_strength = 20
         self.look_ahead = True
@@ -23,21 +86,46 @@ class Window:
     def set_resolution(self, resolution, scale):
         self.resolution = Vector2(resolution)
         self.scale = scale
+        self.render_scale = 1
         self.display = pygame.display.set_mode(self.size, flags=self.flags)
         self.screen = pygame.Surface(self.size)
+        self.upscaled = None
+
+    # Renders the same view at 1/render_scale of the native resolution, e.g. to hold the frame rate.
+    # Only the screen is reallocated, draw scales it back up by the same whole number into the display
+    def set_render_scale(self, render_scale):
+        if render_scale == self.render_scale:
+            return
+        self.render_scale = render_scale
+        self.screen = pygame.Surface(self.render_size)
+        self.upscaled = None if render_scale == 1 else pygame.Surface(self.render_size * render_scale)
 
     def set_target(self, entity, offset=(0, 0)):
         self.target = entity
         self.offset = Vector2(offset)
 
+    @property
+    def native_resolution(self):
+        return Vector2(self.resolution.x // self.scale, self.resolution.y // self.scale)
+
     @property
     def size(self):
         return self.native_resolution
 
+    # The size of the screen surface the world is rendered into
+    @property
+    def render_size(self):
+        return Vector2(math.ceil(self.size.x / self.render_scale), math.ceil(self.size.y / self.render_scale))
+
+    # The area of the world currently on screen
+    @property
+    def camera(self):
+        return pygame.Rect(self.scroll, self.size)
+
     @property
     def scroll(self):
-        scroll = Vector2(int(self.true_scroll.x), int(self.true_scroll.y))
-        self.scroll_diff = scroll - self.true_scroll
+        scroll = Vector2(int(self.render_scroll.x), int(self.render_scroll.y))
+        self.scroll_diff = scroll - self.render_scroll
         return scroll
 
     def calculate_scroll(self, transform: Vector2):
@@ -47,8 +135,8 @@ class Window:
     def calculate_scroll_rect(self, rect: pygame.Rect):
         # Offset a rectangle relative to the camera
         rect = rect.copy()
-        rect.x -= self.true_scroll.x
-        rect.y -= self.true_scroll.y
+        rect.x -= self.render_scroll.x
+        rect.y -= self.render_scroll.y
         return rect
 
     def follow_target(self):
@@ -80,10 +168,26 @@ class Window:
         ) / self.pan_strength
 
     def update(self):
+        self.previous_scroll.update(self.true_scroll)
         if self.target:
             self.follow_target()
 
+    # Blends the camera between the last two simulation steps for drawing
+    def interpolate(self, alpha):
+        self.render_scroll = self.previous_scroll.lerp(self.true_scroll, alpha)
+
+    # Draws everything queued this frame onto the screen
+    def flush(self):
+        scroll = self.scroll
+        self.queue.flush(self.screen, (scroll.x, scroll.y), self.render_scale)
+
     def draw(self):
-        # Pygame handles scaling with SCALED; no manual scaling is needed
-        self.display.blit(self.screen, (0, 0))
+        self.flush()
+        # Pygame handles scaling to the monitor with SCALED, the screen only needs scaling
+        # when it is rendered below the native resolution
+        if self.render_scale == 1:
+            self.display.blit(self.screen, (0, 0))
+        else:
+            pygame.transform.scale(self.screen, self.upscaled.get_size(), self.upscaled)
+            self.display.blit(self.upscaled, (0, 0))
 
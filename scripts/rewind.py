@@ -0,0 +1,148 @@
+# Modules
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# (name, getter, setter) for every value snapshotted per entity. Setters only run when the
+# entity has the attribute, so plain Entities skip the Player-only fields
+def _set_action(entity, value, rewind):
+    action = rewind.actions[int(value)]
+    if action != entity.action:
+        entity.set_action(action)
+
+
+def _set_transform_x(entity, value, rewind):
+    entity.transform.x = value
+    entity.previous_transform.x = value
+    entity.rect.x = value
+
+
+def _set_transform_y(entity, value, rewind):
+    entity.transform.y = value
+    entity.previous_transform.y = value
+    entity.rect.y = value
+
+
+def _collision_dir(name):
+    return (
+        f"collision_{name}",
+        lambda e: e.collision_dirs[name],
+        lambda e, v, r: e.collision_dirs.__setitem__(name, bool(v)),
+        "collision_dirs",
+    )
+
+
+FIELDS = (
+    ("x", lambda e: e.transform.x, _set_transform_x, "transform"),
+    ("y", lambda e: e.transform.y, _set_transform_y, "transform"),
+    ("vx", lambda e: e.movement.x, lambda e, v, r: setattr(e.movement, "x", v), "movement"),
+    ("vy", lambda e: e.movement.y, lambda e, v, r: setattr(e.movement, "y", v), "movement"),
+    ("rotation", lambda e: e.rotation, lambda e, v, r: setattr(e, "rotation", v), "rotation"),
+    ("flip", lambda e: e.flip, lambda e, v, r: setattr(e, "flip", bool(v)), "flip"),
+    ("action", None, _set_action, "action"),
+    ("anim_phase", lambda e: e.playback.phase, lambda e, v, r: e.playback.seek(v), "playback"),
+    ("anim_rate", lambda e: e.playback.rate, lambda e, v, r: setattr(e.playback, "rate", v), "playback"),
+    ("grounded", lambda e: e.is_grounded, lambda e, v, r: setattr(e, "is_grounded", bool(v)), "is_grounded"),
+    ("jump_buffer", lambda e: e.jump_buffer, lambda e, v, r: setattr(e, "jump_buffer", bool(v)), "jump_buffer"),
+    ("buffer_timer", lambda e: e.buffer_timer.elapsed, lambda e, v, r: setattr(e.buffer_timer, "elapsed", v), "buffer_timer"),
+    ("air_timer", lambda e: e.air_timer.elapsed, lambda e, v, r: setattr(e.air_timer, "elapsed", v), "air_timer"),
+    _collision_dir("bottom"),
+    _collision_dir("top"),
+    _collision_dir("left"),
+    _collision_dir("right"),
+)
+
+
+class RewindBuffer:
+    """
+    Records the state of a fixed set of entities every tick so time can be scrubbed backwards.
+
+    Every keyframe_interval ticks a full float64 keyframe is stored, the ticks in between only store their float32 difference from that keyframe. Both live in ring buffers sized from a memory budget up front, so recording never allocates and the oldest history is overwritten once the budget is full. Input state (held keys) is not part of a snapshot.
+    """
+
+    def __init__(self, entities, budget=4 * 1024 * 1024, keyframe_interval=30):
+        self.entities = list(entities)
+        self.keyframe_interval = keyframe_interval
+        self.fields = [
+            [(getter, setter) if hasattr(e, attr) else None for _, getter, setter, attr in FIELDS]
+            for e in self.entities
+        ]
+        self.actions = []
+        self.action_ids = {}
+
+        shape = (len(self.entities), len(FIELDS))
+        values = shape[0] * shape[1]
+        # bytes per tick: a float32 delta plus its share of a float64 keyframe
+        per_tick = values * 4 + values * 8 / keyframe_interval
+        self.capacity = max(keyframe_interval, int(budget // max(per_tick, 1)))
+        key_count = self.capacity // keyframe_interval + 2
+
+        self.deltas = np.zeros((self.capacity, *shape), dtype=np.float32)
+        self.keyframes = np.zeros((key_count, *shape), dtype=np.float64)
+        self.state = np.zeros(shape, dtype=np.float64)
+        self.scratch = np.zeros(shape, dtype=np.float64)
+
+        self.tick = -1  # newest recorded tick
+        self.oldest = 0
+        logger.info(
+            "Rewind buffer: %d ticks for %d entities (%d KB)",
+            self.capacity,
+            len(self.entities),
+            (self.deltas.nbytes + self.keyframes.nbytes) // 1024,
+        )
+
+    # Number of ticks that can currently be rewound
+    @property
+    def available(self):
+        return max(0, self.tick - self.oldest)
+
+    def action_id(self, action):
+        if action not in self.action_ids:
+            self.action_ids[action] = len(self.actions)
+            self.actions.append(action)
+        return self.action_ids[action]
+
+    # Copies every entity's current state into self.state
+    def capture(self):
+        state = self.state
+        for i, (entity, fields) in enumerate(zip(self.entities, self.fields)):
+            row = state[i]
+            for j, field in enumerate(fields):
+                if field is None:
+                    continue
+                getter = field[0]
+                row[j] = self.action_id(entity.action) if getter is None else getter(entity)
+
+    def record(self):
+        self.capture()
+        self.tick += 1
+        key = self.tick // self.keyframe_interval % len(self.keyframes)
+        if self.tick % self.keyframe_interval == 0:
+            self.keyframes[key] = self.state
+        np.subtract(self.state, self.keyframes[key], out=self.deltas[self.tick % self.capacity], casting="unsafe")
+        self.oldest = max(self.oldest, self.tick - self.capacity + 1)
+
+    # Writes a recorded tick back onto the entities without allocating
+    def restore(self, tick):
+        if not self.oldest <= tick <= self.tick:
+            raise IndexError(f"tick {tick} is not in the buffer ({self.oldest}-{self.tick})")
+        key = tick // self.keyframe_interval % len(self.keyframes)
+        np.add(self.keyframes[key], self.deltas[tick % self.capacity], out=self.scratch)
+        for entity, fields, row in zip(self.entities, self.fields, self.scratch.tolist()):
+            for field, value in zip(fields, row):
+                if field is not None:
+                    field[1](entity, value, self)
+
+    # Rewinds by a number of ticks, dropping the history after it. Returns False once there is nothing left
+    def step_back(self, steps=1):
+        if self.available <= 0:
+            return False
+        self.tick = max(self.oldest, self.tick - steps)
+        self.restore(self.tick)
+        return True
+
+    def clear(self):
+        self.tick = -1
+        self.oldest = 0
@@ -8,6 +8,10 @@ class Settings:
         self.resolution = (pygame.display.Info().current_w,
                            pygame.display.Info().current_h)
         self.targetFPS = 120
+        self.dynamicResolution = True  # raise the render scale when frames run over the targetFPS budget
+        self.tickRate = 60  # fixed simulation steps per second
+        self.maxSteps = 5  # most simulation steps run to catch up in one frame
+        self.profile = False  # start with the frame profiler enabled (toggle with F3)
 
     @property
     def width(self):
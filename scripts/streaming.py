@@ -0,0 +1,113 @@
+# Modules
+import json
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Scripts
+from scripts.framework import load_map
+from scripts.map import EMPTY, Collider, Tile, TileMap, cell_range, grid_specs
+
+logger = logging.getLogger(__name__)
+
+LEVEL_FILE = "level.json"
+
+
+# Splits a grid (as returned by load_map) into a chunked level directory:
+# level.json holds the chunk/tile sizes, colour palette and chunk list, "x_y.csv" each chunk's cells
+def save_chunked_level(grid, path, palette, chunk_size=32, tile_size=16):
+    os.makedirs(path, exist_ok=True)
+    chunks = []
+    height = len(grid)
+    width = max((len(row) for row in grid), default=0)
+    for cy in range(0, height, chunk_size):
+        for cx in range(0, width, chunk_size):
+            rows = [row[cx:cx + chunk_size] for row in grid[cy:cy + chunk_size]]
+            if all(cell.strip() in EMPTY for row in rows for cell in row):
+                continue
+            key = f"{cx // chunk_size}_{cy // chunk_size}"
+            with open(os.path.join(path, key + ".csv"), "w") as file:
+                file.write("\n".join(",".join(row) for row in rows))
+            chunks.append(key)
+
+    with open(os.path.join(path, LEVEL_FILE), "w") as file:
+        json.dump(
+            {
+                "chunk_size": chunk_size,
+                "tile_size": tile_size,
+                "palette": {key: list(color) for key, color in palette.items()},
+                "chunks": chunks,
+            },
+            file,
+            indent=2,
+        )
+    logger.info("Saved %d chunks to %s", len(chunks), path)
+
+
+class StreamingTileMap(TileMap):
+    """
+    A TileMap over a chunked level (see save_chunked_level) that only keeps the chunks within radius chunks of the camera. Chunks are read and parsed on a background thread, turned into tiles on the main thread once ready, and evicted again when the camera moves away.
+    """
+
+    def __init__(self, path, radius=1, **kwargs):
+        super().__init__(**kwargs)
+        with open(os.path.join(path, LEVEL_FILE), "rb") as file:
+            level = json.load(file)
+
+        self.path = path
+        self.radius = radius
+        self.level_chunk_size = level["chunk_size"]
+        self.tile_size = level["tile_size"]
+        self.palette = {key: tuple(color) for key, color in level["palette"].items()}
+        self.available = {tuple(map(int, key.split("_"))) for key in level["chunks"]}
+
+        self.loaded = {}  # chunk -> (tiles, colliders)
+        self.loading = {}  # chunk -> future
+        self.executor = ThreadPoolExecutor(1)
+
+    # Reads a chunk file into tile specs and collider rects (see grid_specs), runs on the loader thread
+    def read_chunk(self, key):
+        grid = load_map(os.path.join(self.path, f"{key[0]}_{key[1]}.csv"))
+        span = self.level_chunk_size * self.tile_size
+        return grid_specs(grid, self.palette, self.tile_size, (key[0] * span, key[1] * span))
+
+    # Returns the chunks within radius of a world rect
+    def chunks_near(self, rect, radius):
+        columns, rows = cell_range(rect, self.level_chunk_size * self.tile_size)
+        return {
+            (x, y)
+            for x in range(columns.start - radius, columns.stop + radius)
+            for y in range(rows.start - radius, rows.stop + radius)
+            if (x, y) in self.available
+        }
+
+    # Queues chunks near the camera, adds the finished ones and evicts far away ones.
+    # wait blocks until every nearby chunk is in, e.g. before spawning the player
+    def stream(self, camera, wait=False):
+        near = self.chunks_near(camera, self.radius)
+        # chunks are kept one chunk further out than they load so the edge doesn't thrash
+        keep = self.chunks_near(camera, self.radius + 1)
+        for key in near:
+            if key not in self.loaded and key not in self.loading:
+                self.loading[key] = self.executor.submit(self.read_chunk, key)
+
+        for key, future in list(self.loading.items()):
+            if wait and key in near:
+                future.result()
+            if future.done():
+                del self.loading[key]
+                if key in near:
+                    specs, rects = future.result()
+                    tiles = [Tile(*spec) for spec in specs]
+                    colliders = [Collider(rect) for rect in rects]
+                    self.add(tiles)
+                    self.add_colliders(*colliders)
+                    self.loaded[key] = (tiles, colliders)
+
+        for key in [key for key in self.loaded if key not in keep]:
+            tiles, colliders = self.loaded.pop(key)
+            self.remove(tiles)
+            self.remove_colliders(*colliders)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
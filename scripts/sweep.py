@@ -0,0 +1,212 @@
+# Headless physics tuning sweeps
+#
+# Plays a scripted input sequence against a TileMap for every combination of
+# Player constants, one simulation per process pool task, and collects the
+# metrics into one table:
+#
+#   python -m scripts.sweep --param acceleration=3,5,7 --param gravity=500,600,700 --out sweep.csv
+
+# Modules
+import os
+import argparse
+import csv
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+# Scripts
+from scripts.animation import Animation, AnimationClock
+from scripts.benchmark import CONTROLS, DT, script_events  # importing it also selects SDL's dummy drivers
+from scripts.entity import Entity, Player
+from scripts.input import Keyboard
+from scripts.map import Tile, TileMap
+from scripts.physics import EntityStore
+
+logger = logging.getLogger(__name__)
+
+FRAMES = 240
+
+# Player constants that can be swept
+PARAMETERS = (
+    "acceleration",
+    "deceleration",
+    "max_speed",
+    "friction",
+    "air_acceleration",
+    "gravity",
+    "jump_speed",
+    "max_fall_speed",
+)
+
+# (colour, position, size), the level from main.py
+LEVEL = (
+    ((100, 0, 0), (0, 200), (5000, 20)),
+    ((100, 0, 0), (1000, 150), (700, 20)),
+    ((255, 255, 0), (2000, 150), (700, 20)),
+    ((0, 0, 255), (3000, 150), (700, 20)),
+)
+
+# (frame, event type, key) - settle, run right, jump once at speed
+SCRIPT = (
+    (30, pygame.KEYDOWN, pygame.K_d),
+    (150, pygame.KEYDOWN, pygame.K_SPACE),
+    (152, pygame.KEYUP, pygame.K_SPACE),
+)
+
+
+# Animations made of blank frames, nothing is drawn in a sweep
+def headless_assets(tag="player", actions=("idle", "run", "jump")):
+    return {f"{tag}/{action}": Animation([pygame.Surface((1, 1))]) for action in actions}
+
+
+def build_map(level=LEVEL):
+    tile_map = TileMap()
+    tile_map.add([Tile(*tile) for tile in level])
+    return tile_map
+
+
+# Runs one simulation and returns (metrics, trajectory of (x, y, vx, vy) per frame)
+def simulate(params, script=SCRIPT, frames=FRAMES, dt=DT, level=LEVEL, start=(50, 170)):
+    clock = AnimationClock()
+    tile_map = build_map(level)
+    player = Player(headless_assets(), "player", start, (9, 18), Keyboard(CONTROLS), clock)
+    for name, value in params.items():
+        setattr(player, name, value)
+
+    events = script_events(script)
+
+    # acceleration is timed from the first frame a movement key goes down
+    move_keys = (CONTROLS.move_left, CONTROLS.move_right)
+    move_start = min(
+        (frame for frame, event_type, key in script if event_type == pygame.KEYDOWN and key in move_keys),
+        default=0,
+    )
+
+    trajectory = []
+    time_to_max_speed = None
+    jump_frame = jump_y = apex_y = landing = None
+    for frame in range(frames):
+        for event in events.get(frame, ()):
+            player.event_handler(event)
+        clock.tick(dt)
+        player.update(dt, tile_map)
+        x, y = player.transform
+        vx, vy = player.movement
+        trajectory.append((x, y, vx, vy))
+
+        if time_to_max_speed is None and frame >= move_start and abs(vx) >= player.max_speed:
+            time_to_max_speed = (frame - move_start + 1) * dt
+        if jump_frame is None and vy < 0:
+            jump_frame, jump_y, apex_y = frame, y, y
+        elif jump_frame is not None and landing is None:
+            apex_y = min(apex_y, y)
+            if player.collision_dirs["bottom"]:
+                landing = (frame, x, y)
+
+    return {
+        **params,
+        "time_to_max_speed": time_to_max_speed,
+        "jump_height": jump_y - apex_y if jump_frame is not None else None,
+        "air_time": (landing[0] - jump_frame) * dt if landing else None,
+        "landing_x": landing[1] if landing else None,
+        "landing_y": landing[2] if landing else None,
+        "final_x": trajectory[-1][0],
+        "final_y": trajectory[-1][1],
+    }, trajectory
+
+
+# Plays a script on a Player and on an EntityStore entity side by side.
+# Returns the frames where their transform or movement differ, which should be none
+def compare_store(script=SCRIPT, frames=FRAMES, dt=DT, level=LEVEL, start=(50, 170)):
+    clock = AnimationClock()
+    tile_map = build_map(level)
+    player = Player(headless_assets(), "player", start, (9, 18), Keyboard(CONTROLS), clock)
+    entity = Entity(headless_assets(), "player", start, (9, 18), clock)
+    store = EntityStore()
+    store.add(entity)
+
+    events = script_events(script)
+
+    mismatches = []
+    for frame in range(frames):
+        for event in events.get(frame, ()):
+            player.event_handler(event)
+            if event.type == pygame.KEYDOWN and event.key == CONTROLS.jump:
+                store.jump(entity)
+        store.set_direction(entity, player.direction.x)
+        clock.tick(dt)
+        player.update(dt, tile_map)
+        store.update(dt, tile_map)
+        if (player.transform, player.movement) != (entity.transform, entity.movement):
+            mismatches.append(frame)
+    return mismatches
+
+
+def run_task(task):
+    params, trajectories, kwargs = task
+    metrics, trajectory = simulate(params, **kwargs)
+    return (metrics, trajectory) if trajectories else (metrics, None)
+
+
+# Returns every combination of a {name: [values]} grid as a list of {name: value}
+def parameter_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# Simulates every parameter set across a process pool.
+# Returns the metrics table, and the trajectories (in the same order) when asked for
+def sweep(param_sets, workers=None, trajectories=False, **kwargs):
+    param_sets = list(param_sets)
+    tasks = [(params, trajectories, kwargs) for params in param_sets]
+    chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(run_task, tasks, chunksize=chunksize))
+
+    table = [metrics for metrics, _ in results]
+    if trajectories:
+        return table, [trajectory for _, trajectory in results]
+    return table
+
+
+def write_csv(table, filename):
+    if not table:
+        return
+    with open(filename, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(table[0]))
+        writer.writeheader()
+        writer.writerows(table)
+
+
+def parse_param(text):
+    name, _, values = text.partition("=")
+    if name not in PARAMETERS:
+        raise argparse.ArgumentTypeError(f"{name!r} is not one of {', '.join(PARAMETERS)}")
+    return name, [float(value) for value in values.split(",") if value]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Sweep Player physics constants headlessly")
+    parser.add_argument("--param", type=parse_param, action="append", default=[], help="name=v1,v2,...")
+    parser.add_argument("--frames", type=int, default=FRAMES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="sweep.csv")
+    parser.add_argument("--check-store", action="store_true", help="check EntityStore against Player on the script and exit")
+    args = parser.parse_args()
+
+    if args.check_store:
+        mismatches = compare_store(frames=args.frames)
+        if mismatches:
+            logger.error("EntityStore differs from Player on %d frames, first %d", len(mismatches), mismatches[0])
+            raise SystemExit(1)
+        logger.info("EntityStore matches Player on all %d frames", args.frames)
+        raise SystemExit(0)
+
+    param_sets = parameter_grid(dict(args.param))
+    logger.info("Simulating %d parameter sets", len(param_sets))
+    table = sweep(param_sets, args.workers, frames=args.frames)
+    write_csv(table, args.out)
+    logger.info("Results written to %s", args.out)
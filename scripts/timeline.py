@@ -0,0 +1,71 @@
+# Modules
+import logging
+
+# Scripts
+from scripts.streaming import StreamingTileMap
+
+logger = logging.getLogger(__name__)
+
+
+class World:
+    """
+    Holds one TileMap per timeline, all loaded at once, with one of them active. Every map keeps its own collision index and chunk cache, so switching timeline only changes which map is active.
+
+    Inactive maps around the camera are kept warm a few chunks per update (prebake): their render chunks are baked and their collider arrays rebuilt before they are needed, so the frame after a switch draws from the cache like any other.
+    """
+
+    def __init__(self, tile_maps, active=0, prebake_budget=2):
+        self.tile_maps = list(tile_maps)
+        self.index = active
+        self.prebake_budget = prebake_budget  # chunks baked per update across the inactive maps
+
+    def __len__(self):
+        return len(self.tile_maps)
+
+    @property
+    def active(self):
+        return self.tile_maps[self.index]
+
+    # The timeline after the active one, wrapping around
+    @property
+    def next_index(self):
+        return (self.index + 1) % len(self.tile_maps)
+
+    # Makes a timeline active, the next one by default. Returns the new active map
+    def switch(self, index=None):
+        self.index = self.next_index if index is None else index
+        logger.debug("Switched to timeline %d", self.index)
+        return self.active
+
+    # Whether a rect would be inside solid geometry in a timeline, e.g. the player before switching
+    def would_collide(self, rect, index=None):
+        tile_map = self.tile_maps[self.next_index if index is None else index]
+        return bool(tile_map.collision_test(rect))
+
+    # Streams every timeline around the camera, so all of them have their chunks loaded
+    def stream(self, camera, wait=False):
+        for tile_map in self.tile_maps:
+            if isinstance(tile_map, StreamingTileMap):
+                tile_map.stream(camera, wait)
+
+    # Bakes up to prebake_budget missing render chunks on screen in the inactive timelines
+    def prebake(self, camera):
+        budget = self.prebake_budget
+        for i, tile_map in enumerate(self.tile_maps):
+            if i == self.index:
+                continue
+            if tile_map.bounds_dirty:
+                tile_map.update_bounds()
+            columns, rows = tile_map.chunk_range(camera)
+            for x in columns:
+                for y in rows:
+                    if budget <= 0:
+                        return
+                    if (x, y) not in tile_map.chunks:
+                        tile_map.get_chunk((x, y))
+                        budget -= 1
+
+    def close(self):
+        for tile_map in self.tile_maps:
+            if isinstance(tile_map, StreamingTileMap):
+                tile_map.close()